@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Benchmark and load-test suite for both servers
+Seeds a throwaway database, then drives malin.py and simcard_status_api.py
+in-process through httpx's ASGI transport. The main API's external client is
+routed to the status app the same way, so no network or running server is
+needed. Results can be written as JSON and compared against a stored baseline.
+
+    python benchmark.py --simcards 50000 --output baseline.json
+    python benchmark.py --simcards 50000 --baseline baseline.json --fail-over 15
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+SCENARIOS = ("list", "statistics", "assign", "import", "auto-check", "status-bulk", "mixed", "contention")
+REGIONS = ("Toshkent", "Samarqand", "Buxoro", "Andijon", "Farg'ona", "Namangan", "Xorazm", "Navoiy")
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def seed_database(conn: sqlite3.Connection, shops: int, simcards: int, logs: int, seed: int) -> Dict[str, Any]:
+    """Fill an initialized database with deterministic shops, simcards and status logs"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    
+    shop_rows = []
+    for i in range(shops):
+        region = REGIONS[i % len(REGIONS)]
+        shop_rows.append((
+            f"bench-shop-{i:05d}", f"Do'kon {i}", f"Egasi {i}", f"+99890{i:07d}", f"{region}, {i}-uy",
+            41.0 + rng.random(), 69.0 + rng.random(), "active", region, "[]",
+            (now - timedelta(days=rng.uniform(30, 365))).isoformat()
+        ))
+    conn.executemany("""
+        INSERT INTO shops (id, name, ownerName, ownerPhone, address, latitude, longitude, status, region,
+                           assignedSimCards, addedDate)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, shop_rows)
+    
+    simcard_rows = []
+    for i in range(simcards):
+        added = now - timedelta(days=rng.uniform(0, 90))
+        roll = rng.random()
+        if roll < 0.55 or not shop_rows:
+            status, shop, sale_date = "available", None, None
+        else:
+            shop = rng.choice(shop_rows)
+            status = "sold" if roll >= 0.9 else "assigned"
+            sale_date = (added + timedelta(days=rng.uniform(0, 30))).isoformat() if status == "sold" else None
+        simcard_rows.append((
+            f"bench-sim-{i:08d}", f"8999{i:011d}", status,
+            shop[0] if shop else None, shop[1] if shop else None, added.isoformat(), sale_date
+        ))
+    conn.executemany("""
+        INSERT INTO simcards (id, code, status, assignedTo, assignedShopName, addedDate, saleDate)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, simcard_rows)
+    
+    log_rows = []
+    for i in range(logs if simcard_rows else 0):
+        simcard = rng.choice(simcard_rows)
+        log_rows.append((
+            f"bench-log-{i:08d}", simcard[0], simcard[1], "assigned", "sold", "benchmark",
+            (now - timedelta(days=rng.uniform(0, 90))).isoformat(), None
+        ))
+    conn.executemany("""
+        INSERT INTO status_check_logs (id, simcard_id, simcard_code, old_status, new_status, source, timestamp, details)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, log_rows)
+    conn.commit()
+    
+    return {
+        "shopIds": [row[0] for row in shop_rows],
+        "assignedIds": [row[0] for row in simcard_rows if row[2] == "assigned"],
+        "codes": [row[1] for row in simcard_rows],
+        "available": sum(1 for row in simcard_rows if row[2] == "available")
+    }
+
+class BenchmarkContext:
+    """Clients and seeded ids shared by the scenarios"""
+    
+    def __init__(self, main, status, seeded: Dict[str, Any], args):
+        self.main = main
+        self.status = status
+        self.shop_ids = seeded["shopIds"]
+        self.assigned_ids = seeded["assignedIds"]
+        self.codes = seeded["codes"]
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.import_batches = itertools.count()
+
+# Scenarios: one request each, returning the response
+async def op_list(ctx: BenchmarkContext):
+    params = ctx.rng.choice([
+        {"limit": 100},
+        {"limit": 100, "status": ctx.rng.choice(["available", "assigned", "sold"])},
+        {"limit": 100, "shopId": ctx.rng.choice(ctx.shop_ids)} if ctx.shop_ids else {"limit": 100}
+    ])
+    return await ctx.main.get("/simcards", params=params)
+
+async def op_statistics(ctx: BenchmarkContext):
+    return await ctx.main.get("/statistics")
+
+async def op_assign(ctx: BenchmarkContext):
+    return await ctx.main.post("/simcards/assign", json={
+        "shopId": ctx.rng.choice(ctx.shop_ids), "count": ctx.args.assign_size
+    })
+
+async def op_import(ctx: BenchmarkContext, size: Optional[int] = None):
+    batch = next(ctx.import_batches)
+    size = size or ctx.args.import_size
+    body = "\n".join(f"77{ctx.args.seed % 1000:03d}{batch:06d}{j:05d}" for j in range(size))
+    return await ctx.main.post("/simcards/import", content=body.encode(),
+                               headers={"Content-Type": "text/plain"})
+
+async def op_auto_check(ctx: BenchmarkContext):
+    ids = ctx.rng.sample(ctx.assigned_ids, min(ctx.args.check_size, len(ctx.assigned_ids)))
+    return await ctx.main.post("/simcards/auto-check", json={
+        "simCards": [{"id": simcard_id} for simcard_id in ids], "force": True
+    })
+
+async def op_status_bulk(ctx: BenchmarkContext):
+    codes = ctx.rng.sample(ctx.codes, min(ctx.args.check_size * 10, len(ctx.codes)))
+    return await ctx.status.post("/bulk-check-simcards", json={"codes": codes})
+
+async def op_check_status(ctx: BenchmarkContext):
+    return await ctx.main.get(f"/simcards/{ctx.rng.choice(ctx.assigned_ids)}/check-status",
+                              params={"force": "true"})
+
+async def op_history(ctx: BenchmarkContext):
+    return await ctx.main.get(f"/simcards/{ctx.rng.choice(ctx.assigned_ids)}/history")
+
+async def op_verify_statistics(ctx: BenchmarkContext):
+    return await ctx.main.get("/admin/statistics/verify")
+
+async def op_mixed(ctx: BenchmarkContext):
+    roll = ctx.rng.random()
+    if roll < 0.55:
+        return await op_list(ctx)
+    if roll < 0.65:
+        return await op_statistics(ctx)
+    if roll < 0.75:
+        return await op_assign(ctx)
+    if roll < 0.9:
+        return await op_check_status(ctx)
+    return await op_import(ctx, size=100)
+
+SCENARIO_OPS: Dict[str, Callable[[BenchmarkContext], Awaitable[Any]]] = {
+    "list": op_list,
+    "statistics": op_statistics,
+    "assign": op_assign,
+    "import": op_import,
+    "auto-check": op_auto_check,
+    "status-bulk": op_status_bulk,
+    "mixed": op_mixed,
+    "contention": op_history
+}
+
+# Heavy requests kept running in the background while a scenario is measured
+BACKGROUND_OPS: Dict[str, Callable[[BenchmarkContext], Awaitable[Any]]] = {
+    "contention": op_verify_statistics
+}
+
+async def run_scenario(ctx: BenchmarkContext, name: str, requests: int, concurrency: int, warmup: int) -> Dict[str, Any]:
+    """Run `requests` calls of a scenario with `concurrency` workers and summarize latency"""
+    op = SCENARIO_OPS[name]
+    for _ in range(warmup):
+        await op(ctx)
+    
+    latencies: List[float] = []
+    errors = 0
+    sequence = itertools.count()
+    
+    async def worker():
+        nonlocal errors
+        while next(sequence) < requests:
+            started = time.perf_counter()
+            try:
+                response = await op(ctx)
+                failed = response.status_code >= 400
+            except Exception as e:
+                logging.getLogger("benchmark").debug(f"{name} request failed: {e}")
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            errors += failed
+    
+    async def background():
+        while True:
+            await BACKGROUND_OPS[name](ctx)
+    
+    background_task = asyncio.create_task(background()) if name in BACKGROUND_OPS else None
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    finally:
+        if background_task:
+            background_task.cancel()
+            try:
+                await background_task
+            except asyncio.CancelledError:
+                pass
+    elapsed = time.perf_counter() - started
+    
+    latencies.sort()
+    summary = {
+        "requests": len(latencies),
+        "errors": errors,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "meanMs": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "p50Ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95Ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99Ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "maxMs": round(latencies[-1] * 1000, 3) if latencies else 0.0
+    }
+    if name == "import":
+        summary["rowsPerSecond"] = round(summary["throughput"] * ctx.args.import_size, 2)
+    return summary
+
+def compare_with_baseline(results: Dict[str, Any], baseline: Dict[str, Any], fail_over: Optional[float]) -> bool:
+    """Print per-scenario deltas against a baseline; True if any exceeds `fail_over` percent"""
+    regressed = False
+    print("\nBaseline comparison (positive = slower):")
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            print(f"  {name:<12} (not in baseline)")
+            continue
+        deltas = {}
+        for field in ("p50Ms", "p95Ms", "p99Ms"):
+            deltas[field] = (current[field] / previous[field] - 1) * 100 if previous[field] else 0.0
+        deltas["throughput"] = (1 - current["throughput"] / previous["throughput"]) * 100 if previous["throughput"] else 0.0
+        worst = max(deltas["p95Ms"], deltas["throughput"])
+        flag = ""
+        if fail_over is not None and worst > fail_over:
+            regressed = True
+            flag = "  REGRESSION"
+        print(f"  {name:<12} p50 {deltas['p50Ms']:+6.1f}%  p95 {deltas['p95Ms']:+6.1f}%  "
+              f"p99 {deltas['p99Ms']:+6.1f}%  throughput {-deltas['throughput']:+6.1f}%{flag}")
+    return regressed
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    # Imported here so SIMCARD_DB (set in main) is picked up by database.py
+    import httpx
+    import malin
+    import simcard_status_api
+    
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+    
+    # Route the main API's external status calls to the in-process status app
+    malin.create_external_client = lambda: httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=simcard_status_api.app),
+        base_url="http://status-api",
+        timeout=malin.EXTERNAL_API_TIMEOUT
+    )
+    
+    malin.init_database()
+    started = time.perf_counter()
+    conn = sqlite3.connect(os.environ["SIMCARD_DB"])
+    try:
+        seeded = seed_database(conn, args.shops, args.simcards, args.logs, args.seed)
+    finally:
+        conn.close()
+    print(f"Seeded {args.shops} shops, {args.simcards} simcards, {args.logs} logs "
+          f"in {time.perf_counter() - started:.1f}s")
+    if not seeded["shopIds"] or not seeded["assignedIds"]:
+        raise SystemExit("Need at least one shop and one assigned simcard; raise --shops/--simcards")
+    
+    await malin.startup_event()
+    await simcard_status_api.startup_event()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=malin.app),
+                                     base_url="http://main-api", timeout=120) as main_client, \
+                   httpx.AsyncClient(transport=httpx.ASGITransport(app=simcard_status_api.app),
+                                     base_url="http://status-api", timeout=120) as status_client:
+            ctx = BenchmarkContext(main_client, status_client, seeded, args)
+            scenarios = {}
+            for name in args.scenarios:
+                requests = args.import_requests if name == "import" else args.requests
+                summary = await run_scenario(ctx, name, requests, args.concurrency, args.warmup)
+                scenarios[name] = summary
+                print(f"  {name:<12} {summary['throughput']:>9.1f} req/s  p50 {summary['p50Ms']:>8.2f} ms  "
+                      f"p95 {summary['p95Ms']:>8.2f} ms  p99 {summary['p99Ms']:>8.2f} ms  errors {summary['errors']}")
+    finally:
+        try:
+            await simcard_status_api.shutdown_event()
+        finally:
+            await malin.shutdown_event()
+    
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "params": {key: value for key, value in vars(args).items()
+                       if key not in ("output", "baseline", "fail_over", "verbose", "db", "keep_db")}
+        },
+        "scenarios": scenarios
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="In-process benchmark for the SimCard API servers")
+    parser.add_argument("--shops", type=int, default=200)
+    parser.add_argument("--simcards", type=int, default=20000)
+    parser.add_argument("--logs", type=int, default=20000, help="status_check_logs rows to seed")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for data and request mix")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--import-requests", type=int, default=20, help="requests for the import scenario")
+    parser.add_argument("--import-size", type=int, default=1000, help="codes per import request")
+    parser.add_argument("--assign-size", type=int, default=5, help="cards per assign request")
+    parser.add_argument("--check-size", type=int, default=50, help="cards per auto-check request (x10 for status-bulk)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=10, help="untimed requests before each scenario")
+    parser.add_argument("--db", help="database file to create (default: a temporary file)")
+    parser.add_argument("--keep-db", action="store_true", help="keep the seeded database afterwards")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against a previous --output file")
+    parser.add_argument("--fail-over", type=float, help="exit 1 if p95 or throughput regresses by more than this %%")
+    parser.add_argument("--verbose", action="store_true", help="keep server INFO logs")
+    args = parser.parse_args()
+    
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in args.scenarios if name not in SCENARIO_OPS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    
+    temp_dir = None if args.db else tempfile.mkdtemp(prefix="simcard-bench-")
+    database = args.db or os.path.join(temp_dir, "bench.sqlite")
+    if os.path.exists(database):
+        parser.error(f"{database} already exists; the benchmark always seeds a fresh database")
+    os.environ["SIMCARD_DB"] = database
+    os.environ["SWEEP_ENABLED"] = "0"
+    
+    print(f"Benchmark database: {database}")
+    try:
+        results = asyncio.run(run_benchmark(args))
+    finally:
+        if not args.keep_db:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(database + suffix):
+                    os.remove(database + suffix)
+            if temp_dir:
+                os.rmdir(temp_dir)
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare_with_baseline(results, baseline, args.fail_over):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
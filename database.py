@@ -0,0 +1,672 @@
+"""
+Shared SQLite connection pool
+Used by both the main API (malin.py) and the status API (simcard_status_api.py),
+which share one database file. Connections are opened in WAL mode with tuned
+pragmas so readers and writers in the two processes do not block each other.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Dict, Any, List, Optional
+import asyncio
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+from metrics import REGISTRY, QUERY_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+# Database file shared by both servers
+DATABASE_NAME = os.getenv("SIMCARD_DB", "simcard_db.sqlite")
+
+# Pool and pragma configuration
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "16"))
+SQLITE_POOL_TIMEOUT = float(os.getenv("SQLITE_POOL_TIMEOUT", "30.0"))  # seconds to wait for a free connection
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # NORMAL is durable enough in WAL mode
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "32768"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_READ_THREADS = int(os.getenv("SQLITE_READ_THREADS", "8"))  # reader threads of AsyncDatabase
+
+# Opt-in statement tracing (can also be toggled at runtime via the tracer)
+SQLITE_TRACE = os.getenv("SQLITE_TRACE", "false").lower() in ("1", "true", "yes")
+SQLITE_SLOW_QUERY_MS = float(os.getenv("SQLITE_SLOW_QUERY_MS", "100"))
+SQLITE_TRACE_MAX_STATEMENTS = int(os.getenv("SQLITE_TRACE_MAX_STATEMENTS", "500"))  # distinct normalized statements kept
+SQLITE_TRACE_PROGRESS_STEPS = int(os.getenv("SQLITE_TRACE_PROGRESS_STEPS", "1000"))  # VM instructions per progress tick
+SQLITE_SLOW_LOG_SIZE = int(os.getenv("SQLITE_SLOW_LOG_SIZE", "50"))
+
+# Query metrics; statements are labelled by their leading keyword only to keep cardinality fixed
+QUERY_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "BEGIN", "COMMIT", "ROLLBACK", "WITH", "PRAGMA"}
+
+sqlite_query_duration = REGISTRY.histogram(
+    "sqlite_query_duration_seconds", "SQLite statement execution time (execute/executemany, excluding fetches)",
+    ("operation",), QUERY_BUCKETS
+)
+sqlite_errors = REGISTRY.counter(
+    "sqlite_errors_total", "SQLite errors by kind (locked = database is locked/busy after busy_timeout)", ("kind",)
+)
+sqlite_write_lock_wait = REGISTRY.histogram(
+    "sqlite_write_lock_wait_seconds", "Time taken by BEGIN IMMEDIATE to acquire the write lock", (), QUERY_BUCKETS
+)
+sqlite_pool_wait = REGISTRY.histogram(
+    "sqlite_pool_wait_seconds", "Time spent waiting for a free pooled connection", (), QUERY_BUCKETS
+)
+sqlite_executor_wait = REGISTRY.histogram(
+    "sqlite_executor_wait_seconds", "Time a database call queued for a reader or writer thread", ("kind",),
+    QUERY_BUCKETS
+)
+
+def _observe_statement(sql: str, started: float):
+    elapsed = time.perf_counter() - started
+    keyword = sql.lstrip()[:8].split(None, 1)
+    operation = keyword[0].upper() if keyword else "OTHER"
+    if operation not in QUERY_OPERATIONS:
+        operation = "OTHER"
+    sqlite_query_duration.observe(elapsed, operation)
+    if operation == "BEGIN" and "IMMEDIATE" in sql.upper():
+        sqlite_write_lock_wait.observe(elapsed)
+
+def _record_error(error: sqlite3.Error):
+    message = str(error).lower()
+    sqlite_errors.inc("locked" if "locked" in message or "busy" in message else "other")
+
+# Statement tracing
+_STRING_LITERAL = re.compile(r"[xX]?'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_NULL_LITERAL = re.compile(r"(?<!IS )(?<!NOT )\bNULL\b", re.IGNORECASE)
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_EXPLAINABLE = {"SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH"}
+
+@lru_cache(maxsize=2048)
+def normalize_statement(sql: str) -> str:
+    """Collapse whitespace and replace literals and IN-lists with placeholders"""
+    text = " ".join(sql.split())
+    text = _STRING_LITERAL.sub("?", text)
+    text = _NUMBER_LITERAL.sub("?", text)
+    text = _NULL_LITERAL.sub("?", text)
+    text = _PLACEHOLDER_LIST.sub("(?, ...)", text)
+    return text[:2000]
+
+class QueryTracer:
+    """Per-statement latency, row and VM-step counters with a slow-query log
+
+    Cursors created while tracing is enabled time execute and every fetch, so
+    SELECT cost is attributed even though SQLite does most of the work while
+    rows are fetched. The connection's progress handler counts VM steps and
+    its trace callback picks up statements the sqlite3 module runs on its own
+    (implicit BEGIN, COMMIT). Statements whose time crosses the slow threshold
+    are logged once per call together with their EXPLAIN QUERY PLAN.
+    """
+
+    def __init__(self, enabled: bool = SQLITE_TRACE, slow_ms: float = SQLITE_SLOW_QUERY_MS,
+                 max_statements: int = SQLITE_TRACE_MAX_STATEMENTS,
+                 progress_steps: int = SQLITE_TRACE_PROGRESS_STEPS, slow_log_size: int = SQLITE_SLOW_LOG_SIZE):
+        self.enabled = enabled
+        self.slow_seconds = slow_ms / 1000
+        self.max_statements = max(1, max_statements)
+        self.progress_steps = max(1, progress_steps)
+        self._statements: Dict[str, Dict[str, Any]] = {}
+        self._plans: Dict[str, List[str]] = {}
+        self._slow = deque(maxlen=max(1, slow_log_size))
+        self._lock = threading.Lock()
+        self.since = datetime.now().isoformat()
+
+    def install(self, conn: "TimedConnection"):
+        conn.set_progress_handler(conn._progress_tick, self.progress_steps)
+        conn.set_trace_callback(conn._trace_statement)
+        conn._tracing = True
+
+    def uninstall(self, conn: "TimedConnection"):
+        conn.set_progress_handler(None, 0)
+        conn.set_trace_callback(None)
+        conn._tracing = False
+
+    def _entry(self, key: str) -> Dict[str, Any]:
+        entry = self._statements.get(key)
+        if entry is None:
+            if len(self._statements) >= self.max_statements:
+                key = "<other statements>"
+                entry = self._statements.get(key)
+            if entry is None:
+                entry = self._statements[key] = {
+                    "statement": key, "calls": 0, "errors": 0, "slow": 0,
+                    "totalSeconds": 0.0, "maxSeconds": 0.0, "rows": 0, "vmSteps": 0
+                }
+        return entry
+
+    def record(self, key: str, elapsed: float = 0.0, rows: int = 0, ticks: int = 0,
+               new_call: bool = False, error: bool = False, call_seconds: Optional[float] = None):
+        with self._lock:
+            entry = self._entry(key)
+            if new_call:
+                entry["calls"] += 1
+            if error:
+                entry["errors"] += 1
+            entry["totalSeconds"] += elapsed
+            entry["rows"] += rows
+            entry["vmSteps"] += ticks * self.progress_steps
+            call_seconds = elapsed if call_seconds is None else call_seconds
+            if call_seconds > entry["maxSeconds"]:
+                entry["maxSeconds"] = call_seconds
+
+    def finish_part(self, conn: "TimedConnection", call: list, elapsed: float, rows: int, ticks: int,
+                    new_call: bool = False, error: bool = False):
+        """Add one execute/fetch of a call; log the call once it turns slow
+
+        `call` is [key, sql, parameters, seconds so far, rows so far, logged].
+        """
+        call[3] += elapsed
+        call[4] += rows
+        self.record(call[0], elapsed, rows, ticks, new_call, error, call[3])
+        if not call[5] and call[3] >= self.slow_seconds:
+            call[5] = True
+            self._log_slow(conn, call)
+
+    def _log_slow(self, conn: "TimedConnection", call: list):
+        key, sql, parameters, seconds, rows, _ = call
+        plan = self._plans.get(key)
+        if plan is None:
+            plan = self.explain(conn, sql, parameters)
+            self._plans[key] = plan
+        with self._lock:
+            self._entry(key)["slow"] += 1
+            self._slow.append({
+                "at": datetime.now().isoformat(),
+                "statement": key,
+                "ms": round(seconds * 1000, 2),
+                "rows": rows,
+                "plan": plan
+            })
+        logger.warning(
+            f"Slow query ({seconds * 1000:.1f} ms, {rows} rows so far): {key}"
+            + "".join(f"\n    {line}" for line in plan)
+        )
+
+    def explain(self, conn: "TimedConnection", sql: str, parameters) -> List[str]:
+        """EXPLAIN QUERY PLAN of a statement as indented lines"""
+        keyword = sql.lstrip()[:8].split(None, 1)
+        if parameters is None or not keyword or keyword[0].upper() not in _EXPLAINABLE:
+            return []
+        conn._trace_muted = True
+        try:
+            rows = conn.cursor(sqlite3.Cursor).execute("EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+        except sqlite3.Error as e:
+            return [f"(plan unavailable: {e})"]
+        finally:
+            conn._trace_muted = False
+        depth = {0: -1}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[node_id] + detail)
+        return lines
+
+    def top(self, limit: int = 20, sort: str = "total") -> List[Dict[str, Any]]:
+        """Normalized statements ordered by total, avg or max time, calls or rows"""
+        with self._lock:
+            entries = [dict(entry) for entry in self._statements.values()]
+        for entry in entries:
+            entry["avgMs"] = round(entry["totalSeconds"] * 1000 / entry["calls"], 3) if entry["calls"] else 0.0
+            entry["totalMs"] = round(entry.pop("totalSeconds") * 1000, 3)
+            entry["maxMs"] = round(entry.pop("maxSeconds") * 1000, 3)
+            entry["plan"] = self._plans.get(entry["statement"])
+        sort_key = {"total": "totalMs", "avg": "avgMs", "max": "maxMs", "calls": "calls", "rows": "rows"}[sort]
+        entries.sort(key=lambda entry: entry[sort_key], reverse=True)
+        return entries[:limit]
+
+    def slow_queries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(reversed(self._slow))
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+            self._plans.clear()
+            self._slow.clear()
+            self.since = datetime.now().isoformat()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "slowThresholdMs": self.slow_seconds * 1000,
+                "statements": len(self._statements),
+                "slowLogged": sum(entry["slow"] for entry in self._statements.values()),
+                "since": self.since
+            }
+
+query_tracer = QueryTracer()
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor recording statement timings and errors in the metrics registry"""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        except sqlite3.Error as e:
+            _record_error(e)
+            raise
+        finally:
+            _observe_statement(sql, started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        except sqlite3.Error as e:
+            _record_error(e)
+            raise
+        finally:
+            _observe_statement(sql, started)
+
+class TracedCursor(TimedCursor):
+    """TimedCursor that also feeds the query tracer (used while tracing is enabled)"""
+
+    _trace_call = None
+
+    def _traced(self, method, sql, parameters, rows_of=None):
+        conn = self.connection
+        key = normalize_statement(sql)
+        call = self._trace_call = [key, sql, parameters, 0.0, 0, False]
+        ticks = conn._vm_ticks
+        conn._trace_key = key
+        started = time.perf_counter()
+        try:
+            result = method(sql, parameters if parameters is not None else ())
+        except sqlite3.Error:
+            query_tracer.finish_part(conn, call, time.perf_counter() - started, 0, conn._vm_ticks - ticks,
+                                     new_call=True, error=True)
+            raise
+        finally:
+            conn._trace_key = None
+        rows = self.rowcount if self.rowcount > 0 else 0
+        query_tracer.finish_part(conn, call, time.perf_counter() - started, rows, conn._vm_ticks - ticks, new_call=True)
+        return result
+
+    def execute(self, sql, parameters=()):
+        return self._traced(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        # Plans are not captured for executemany (no single parameter set)
+        execute_many = super().executemany
+        return self._traced(lambda sql, _: execute_many(sql, seq_of_parameters), sql, None)
+
+    def _fetched(self, fetch, *args):
+        call = self._trace_call
+        if call is None:
+            return fetch(*args)
+        conn = self.connection
+        ticks = conn._vm_ticks
+        started = time.perf_counter()
+        result = fetch(*args)
+        if isinstance(result, list):
+            rows = len(result)
+        else:
+            rows = 0 if result is None else 1
+        query_tracer.finish_part(conn, call, time.perf_counter() - started, rows, conn._vm_ticks - ticks)
+        return result
+
+    def fetchone(self):
+        return self._fetched(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetched(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._fetched(super().fetchall)
+
+    def __next__(self):
+        row = self._fetched(super().fetchone)
+        if row is None:
+            raise StopIteration
+        return row
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors (including Connection.execute shortcuts) are TimedCursors
+
+    While the query tracer is enabled cursors are TracedCursors and the
+    tracer's progress handler and trace callback are installed; the check
+    happens per cursor, so tracing can be switched on without reconnecting.
+    """
+
+    _tracing = False
+    _trace_key = None
+    _trace_muted = False
+    _vm_ticks = 0
+
+    def cursor(self, factory=None):
+        if factory is None:
+            if query_tracer.enabled != self._tracing:
+                if query_tracer.enabled:
+                    query_tracer.install(self)
+                else:
+                    query_tracer.uninstall(self)
+            factory = TracedCursor if self._tracing else TimedCursor
+        return super().cursor(factory)
+
+    def commit(self):
+        started = time.perf_counter()
+        self._trace_key = "COMMIT"
+        try:
+            return super().commit()
+        finally:
+            self._trace_key = None
+            _observe_statement("COMMIT", started)
+            if self._tracing:
+                query_tracer.record("COMMIT", time.perf_counter() - started, new_call=True)
+
+    def _progress_tick(self):
+        self._vm_ticks += 1
+
+    def _trace_statement(self, sql: str):
+        # Statements run by the sqlite3 module itself (implicit BEGIN, COMMIT)
+        # and not already accounted for by a traced cursor
+        if self._trace_muted or sql is None:
+            return
+        key = normalize_statement(sql)
+        if key != self._trace_key:
+            query_tracer.record(key, new_call=True)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+def configure_connection(conn: sqlite3.Connection) -> sqlite3.Connection:
+    """Apply WAL mode and performance pragmas to a connection"""
+    conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+def connect(database: Optional[str] = None) -> sqlite3.Connection:
+    """Open a configured connection that may be used from any thread"""
+    conn = sqlite3.connect(
+        database or DATABASE_NAME,
+        timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        factory=TimedConnection
+    )
+    conn.row_factory = sqlite3.Row
+    return configure_connection(conn)
+
+class ConnectionPool:
+    """Thread-safe pool of configured SQLite connections
+
+    Connections are created lazily up to `size`; callers wait up to
+    `timeout` seconds for a free one when the pool is exhausted.
+    """
+
+    def __init__(self, database: str, size: int = SQLITE_POOL_SIZE, timeout: float = SQLITE_POOL_TIMEOUT):
+        self.database = database
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._waits = 0
+        self._closed = False
+
+    def acquire(self) -> sqlite3.Connection:
+        """Take a connection from the pool, opening a new one if allowed"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    create = True
+                else:
+                    self._waits += 1
+                    create = False
+            if create:
+                try:
+                    conn = connect(self.database)
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                wait_started = time.perf_counter()
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    sqlite_errors.inc("pool_exhausted")
+                    raise sqlite3.OperationalError(
+                        f"SQLite connection pool exhausted ({self.size} connections in use)"
+                    )
+                finally:
+                    sqlite_pool_wait.observe(time.perf_counter() - wait_started)
+
+        with self._lock:
+            self._in_use += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool, discarding it if it is broken"""
+        with self._lock:
+            self._in_use -= 1
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            logger.warning("Discarding broken pooled SQLite connection")
+            self._discard(conn)
+            return
+
+        if self._closed:
+            self._discard(conn)
+        else:
+            self._idle.put(conn)
+
+    def _discard(self, conn: sqlite3.Connection):
+        with self._lock:
+            self._created -= 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding a pooled connection"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Close all idle connections; busy ones are closed on release"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._created,
+                "inUse": self._in_use,
+                "idle": self._idle.qsize(),
+                "waits": self._waits
+            }
+
+# One pool per database file and process
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(database: Optional[str] = None) -> ConnectionPool:
+    """Get (or create) the process-wide pool for a database file"""
+    database = database or DATABASE_NAME
+    with _pools_lock:
+        pool = _pools.get(database)
+        if pool is None or pool._closed:
+            pool = ConnectionPool(database)
+            _pools[database] = pool
+        return pool
+
+def _pool_metrics() -> Dict[tuple, float]:
+    with _pools_lock:
+        pools = list(_pools.items())
+    values = {}
+    for database, pool in pools:
+        stats = pool.stats()
+        for state in ("open", "inUse", "idle", "waits"):
+            values[(os.path.basename(database), state)] = stats[state]
+    return values
+
+REGISTRY.gauge("sqlite_pool_connections", "Connection pool state per database file (waits is cumulative)",
+               _pool_metrics, ("database", "state"))
+
+class AsyncDatabase:
+    """Awaitable SQLite access that keeps blocking calls off the event loop
+
+    Reads run on a dedicated pool of reader threads with pooled connections.
+    Writes run on a single writer thread that owns its own connection, so
+    write transactions of this process queue up in order instead of
+    contending for SQLite's write lock; each one is committed when its
+    function returns and rolled back if it raises. `on_commit` is called on
+    the writer thread after each commit that changed rows.
+    """
+
+    def __init__(self, database: Optional[str] = None, read_threads: int = SQLITE_READ_THREADS,
+                 on_commit: Optional[Callable[[], None]] = None):
+        self.database = database or DATABASE_NAME
+        self.read_threads = max(1, read_threads)
+        self.on_commit = on_commit
+        self._readers: Optional[ThreadPoolExecutor] = None
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._writer_conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._pending = {"read": 0, "write": 0}
+        self._completed = {"read": 0, "write": 0}
+
+    def _executor(self, kind: str) -> ThreadPoolExecutor:
+        # Created lazily, so the layer can be used again after close()
+        with self._lock:
+            if kind == "write":
+                if self._writer is None:
+                    self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-writer")
+                return self._writer
+            if self._readers is None:
+                self._readers = ThreadPoolExecutor(max_workers=self.read_threads, thread_name_prefix="sqlite-reader")
+            return self._readers
+
+    async def _submit(self, kind: str, fn, *args, **kwargs):
+        submitted = time.perf_counter()
+
+        def call():
+            sqlite_executor_wait.observe(time.perf_counter() - submitted, kind)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._pending[kind] -= 1
+                    self._completed[kind] += 1
+
+        executor = self._executor(kind)
+        with self._lock:
+            self._pending[kind] += 1
+        try:
+            future = asyncio.get_running_loop().run_in_executor(executor, call)
+        except Exception:
+            with self._lock:
+                self._pending[kind] -= 1
+            raise
+        return await future
+
+    async def run(self, fn, *args, **kwargs):
+        """Run a blocking callable that manages its own connection on a reader thread"""
+        return await self._submit("read", fn, *args, **kwargs)
+
+    async def read(self, fn, *args, **kwargs):
+        """Run fn(conn, *args) with a pooled connection on a reader thread"""
+        return await self._submit("read", self._read, fn, args, kwargs)
+
+    async def write(self, fn, *args, **kwargs):
+        """Run fn(conn, *args) as one transaction on the writer thread"""
+        return await self._submit("write", self._write, fn, args, kwargs)
+
+    async def fetch_all(self, sql: str, params=()) -> List[sqlite3.Row]:
+        return await self.read(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def fetch_one(self, sql: str, params=()) -> Optional[sqlite3.Row]:
+        return await self.read(lambda conn: conn.execute(sql, params).fetchone())
+
+    async def execute(self, sql: str, params=()) -> int:
+        """Run one write statement in its own transaction, returns the affected row count"""
+        return await self.write(lambda conn: conn.execute(sql, params).rowcount)
+
+    def _read(self, fn, args, kwargs):
+        with get_pool(self.database).connection() as conn:
+            return fn(conn, *args, **kwargs)
+
+    def _write(self, fn, args, kwargs):
+        if self._writer_conn is None:
+            self._writer_conn = connect(self.database)
+        conn = self._writer_conn
+        changes = conn.total_changes
+        try:
+            result = fn(conn, *args, **kwargs)
+            conn.commit()
+        except BaseException:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                logger.warning("Discarding broken SQLite writer connection")
+                conn.close()
+                self._writer_conn = None
+            raise
+        if self.on_commit is not None and conn.total_changes != changes:
+            self.on_commit()
+        return result
+
+    def close(self):
+        """Finish queued calls, stop the threads and close the writer connection"""
+        with self._lock:
+            executors = [self._writer, self._readers]
+            self._writer = self._readers = None
+        for executor in executors:
+            if executor is not None:
+                executor.shutdown(wait=True)
+        if self._writer_conn is not None:
+            self._writer_conn.close()
+            self._writer_conn = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "readThreads": self.read_threads,
+                "pendingReads": self._pending["read"],
+                "pendingWrites": self._pending["write"],
+                "reads": self._completed["read"],
+                "writes": self._completed["write"]
+            }
+
+def close_pools():
+    """Close every pool (called at server shutdown)"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
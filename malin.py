@@ -5,8 +5,10 @@ SQLite database with FastAPI + External API Integration
 Port: 9022
 """
 
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response, FileResponse
+from collections import OrderedDict, deque
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import sqlite3
@@ -17,6 +19,19 @@ import json
 import httpx
 import asyncio
 import logging
+import os
+import time
+import base64
+import csv
+import io
+import hashlib
+import re
+import tempfile
+import threading
+import random
+
+from database import DATABASE_NAME, AsyncDatabase, get_pool, close_pools, connect, query_tracer
+from metrics import REGISTRY, MetricsMiddleware, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 # Configure logging  
 logging.basicConfig(level=logging.INFO)
@@ -24,25 +39,96 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="SimCard Management API", version="2.0.0")
 
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Database setup
-DATABASE_NAME = "simcard_db.sqlite"
+# Database setup: DATABASE_NAME (env SIMCARD_DB) and the shared connection pool live in database.py
 
 # External API configuration
 EXTERNAL_API_BASE_URL = "http://localhost:9020"  # SimCard status API
 EXTERNAL_API_TIMEOUT = 10.0
+EXTERNAL_API_BATCH_SIZE = int(os.getenv("EXTERNAL_API_BATCH_SIZE", "500"))  # codes per bulk lookup
+
+# Shared external HTTP client (connection pool) configuration
+EXTERNAL_API_CONNECT_TIMEOUT = float(os.getenv("EXTERNAL_API_CONNECT_TIMEOUT", "3.0"))
+EXTERNAL_API_POOL_TIMEOUT = float(os.getenv("EXTERNAL_API_POOL_TIMEOUT", "10.0"))
+EXTERNAL_API_MAX_CONNECTIONS = int(os.getenv("EXTERNAL_API_MAX_CONNECTIONS", "100"))
+EXTERNAL_API_MAX_KEEPALIVE = int(os.getenv("EXTERNAL_API_MAX_KEEPALIVE", "20"))
+EXTERNAL_API_KEEPALIVE_EXPIRY = float(os.getenv("EXTERNAL_API_KEEPALIVE_EXPIRY", "30.0"))
+
+# External call resilience: retries with jittered exponential backoff, circuit breaker, hedging
+EXTERNAL_API_RETRIES = int(os.getenv("EXTERNAL_API_RETRIES", "2"))  # extra attempts for retryable failures
+EXTERNAL_API_BACKOFF_BASE = float(os.getenv("EXTERNAL_API_BACKOFF_BASE", "0.2"))  # seconds
+EXTERNAL_API_BACKOFF_MAX = float(os.getenv("EXTERNAL_API_BACKOFF_MAX", "2.0"))  # seconds
+EXTERNAL_API_RETRY_STATUSES = {429, 500, 502, 503, 504}
+EXTERNAL_BREAKER_FAILURES = int(os.getenv("EXTERNAL_BREAKER_FAILURES", "5"))  # consecutive failures to open
+EXTERNAL_BREAKER_RESET = float(os.getenv("EXTERNAL_BREAKER_RESET", "30.0"))  # seconds open before a probe
+EXTERNAL_HEDGE_DELAY = float(os.getenv("EXTERNAL_HEDGE_DELAY", "0"))  # seconds; 0 disables hedged requests
+
+# External status result cache: TTL per returned status ("status:seconds,..."; 0 = never cached)
+STATUS_CACHE_MAX_ENTRIES = int(os.getenv("STATUS_CACHE_MAX_ENTRIES", "100000"))
+STATUS_CACHE_DEFAULT_TTL = float(os.getenv("STATUS_CACHE_DEFAULT_TTL", "300"))  # seconds
+STATUS_CACHE_TTLS = {
+    status.strip(): float(ttl)
+    for status, ttl in (item.split(":") for item in os.getenv("STATUS_CACHE_TTLS", "sold:86400,not_found:600,error:0").split(",") if item)
+}
+
+# Auto-check engine configuration
+AUTO_CHECK_CONCURRENCY = int(os.getenv("AUTO_CHECK_CONCURRENCY", "20"))
+AUTO_CHECK_MAX_CONCURRENCY = int(os.getenv("AUTO_CHECK_MAX_CONCURRENCY", "100"))
+AUTO_CHECK_JOB_CHUNK_SIZE = int(os.getenv("AUTO_CHECK_JOB_CHUNK_SIZE", "500"))  # cards per progress step
+AUTO_CHECK_JOB_REUSE_SECONDS = float(os.getenv("AUTO_CHECK_JOB_REUSE_SECONDS", "60"))  # reuse recently finished jobs
+AUTO_CHECK_JOBS_KEPT = int(os.getenv("AUTO_CHECK_JOBS_KEPT", "20"))  # finished jobs kept for polling
+
+# Group-committed status writes (check results, history and status logs)
+STATUS_WRITE_BATCH_SIZE = int(os.getenv("STATUS_WRITE_BATCH_SIZE", "1000"))  # checks per transaction
+STATUS_WRITE_MAX_DELAY = float(os.getenv("STATUS_WRITE_MAX_DELAY", "0.05"))  # seconds a check waits for others
+STATUS_WRITE_MAX_PENDING = int(os.getenv("STATUS_WRITE_MAX_PENDING", "20000"))  # queued checks before producers wait
+STATUS_WRITE_DURABILITY = os.getenv("STATUS_WRITE_DURABILITY", "normal").lower()  # "full" syncs every commit to disk
+
+# Response cache for read-heavy endpoints
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60.0"))  # seconds
+
+# Bulk import configuration
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))  # rows per executemany transaction
+IMPORT_READ_SIZE = 1024 * 1024  # bytes read from the upload at a time
+IMPORT_CONFLICT_FILES_KEPT = int(os.getenv("IMPORT_CONFLICT_FILES_KEPT", "20"))
+
+# Check history retention (entries kept per simcard)
+CHECK_HISTORY_RETENTION = int(os.getenv("CHECK_HISTORY_RETENTION", "10"))
+
+# Background check scheduler configuration
+SWEEP_ENABLED = os.getenv("SWEEP_ENABLED", "0").lower() in ("1", "true", "yes")
+SWEEP_INTERVAL = float(os.getenv("SWEEP_INTERVAL", str(30 * 60)))  # seconds between sweep starts
+SWEEP_RATE = float(os.getenv("SWEEP_RATE", "50"))  # external checks per second
+SWEEP_BURST = int(os.getenv("SWEEP_BURST", "200"))  # token bucket capacity
+SWEEP_CONCURRENCY = int(os.getenv("SWEEP_CONCURRENCY", "4"))
+SWEEP_CHUNK_SIZE = int(os.getenv("SWEEP_CHUNK_SIZE", "1000"))  # cards read from the DB per round
+SWEEP_BATCH_SIZE = int(os.getenv("SWEEP_BATCH_SIZE", "100"))  # codes per external bulk call
+
+# Status change push (Server-Sent Events) configuration
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "1000"))  # buffered events per subscriber before replaying from the DB
+SSE_MAX_SUBSCRIBERS = int(os.getenv("SSE_MAX_SUBSCRIBERS", "100"))
+SSE_POLL_INTERVAL = float(os.getenv("SSE_POLL_INTERVAL", "2.0"))  # seconds; picks up writes from other processes
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", "15.0"))  # seconds between keepalive comments
+SSE_REPLAY_CHUNK = 500  # log rows read per query when replaying
+SSE_RETRY_MS = 3000  # client reconnect delay
+
+# Delta sync configuration
+SYNC_DEFAULT_LIMIT = int(os.getenv("SYNC_DEFAULT_LIMIT", "5000"))  # changed rows per /sync page
+SYNC_TOMBSTONES_KEPT = int(os.getenv("SYNC_TOMBSTONES_KEPT", "100000"))  # older tombstones are pruned at startup
+
+# Streaming export configuration
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))  # rows per fetchmany / yielded chunk
 
 def init_database():
-    """Initialize SQLite database with tables"""
-    conn = sqlite3.connect(DATABASE_NAME)
+    """Initialize SQLite database: bring the schema up to date"""
+    with get_pool(DATABASE_NAME).connection() as conn:
+        version = run_migrations(conn)
+        prune_sync_tombstones(conn)
+    logger.info(f"Database initialized successfully! (schema version {version})")
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version
+def _migration_1_base_schema(conn):
+    """Base tables and the default admin user"""
     cursor = conn.cursor()
     
     # Shops table
@@ -108,59 +194,823 @@ def init_database():
         INSERT OR IGNORE INTO users (id, username, password, role)
         VALUES (?, ?, ?, ?)
     """, (str(uuid.uuid4()), "admin", "admin123", "admin"))
+
+def _migration_2_hot_path_indexes(conn):
+    """Indexes for hot-path queries and an indexable sale day column"""
+    cursor = conn.cursor()
+    
+    # DATE(saleDate) as a virtual generated column, so daily sales can use an index
+    cursor.execute("ALTER TABLE simcards ADD COLUMN saleDay TEXT GENERATED ALWAYS AS (DATE(saleDate)) VIRTUAL")
+    
+    # /simcards/assign (status = 'available'), status counts and status-filtered lists
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_simcards_status_added ON simcards(status, addedDate, id)")
+    # /shops/{id}/stats, delete_shop and /statistics/shops (covers GROUP BY status)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_simcards_assigned_status ON simcards(assignedTo, status)")
+    # /statistics sales by date
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_simcards_sale_day ON simcards(saleDay)")
+    # /simcards ORDER BY addedDate
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_simcards_added ON simcards(addedDate, id)")
+    # /shops ORDER BY addedDate
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_shops_added ON shops(addedDate, id)")
+    # /logs/status-changes ORDER BY timestamp
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_status_logs_timestamp ON status_check_logs(timestamp)")
+
+def _migration_3_list_filter_indexes(conn):
+    """Indexes for keyset-paginated, filtered simcard and shop lists"""
+    cursor = conn.cursor()
+    
+    # /simcards?shopId= (and region, via the shop ids) ordered by (addedDate, id)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_simcards_assigned_added ON simcards(assignedTo, addedDate, id)")
+    # /shops?region= and /simcards?region=
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_shops_region ON shops(region, addedDate, id)")
+
+def _migration_4_check_history_table(conn):
+    """Move checkHistory JSON blobs into an append-only table"""
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS simcard_check_history (
+            id INTEGER PRIMARY KEY,
+            simcard_id TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            external_status TEXT,
+            is_sold INTEGER NOT NULL DEFAULT 0,
+            message TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_check_history_simcard ON simcard_check_history(simcard_id, id)")
+    
+    # Convert existing blobs in order, then empty the legacy column
+    cursor.execute("""
+        INSERT INTO simcard_check_history (simcard_id, timestamp, external_status, is_sold, message)
+        SELECT s.id,
+               COALESCE(json_extract(h.value, '$.timestamp'), s.lastChecked, s.addedDate),
+               json_extract(h.value, '$.external_status'),
+               COALESCE(json_extract(h.value, '$.is_sold'), 0),
+               json_extract(h.value, '$.message')
+        FROM simcards s, json_each(s.checkHistory) h
+        WHERE s.checkHistory IS NOT NULL AND s.checkHistory != '[]' AND json_valid(s.checkHistory)
+        ORDER BY s.id, h.key
+    """)
+    cursor.execute("UPDATE simcards SET checkHistory = '[]' WHERE checkHistory IS NULL OR checkHistory != '[]'")
+
+# Statistics counters: (name, key, subkey) -> value, recomputed from the base tables
+STAT_COUNTER_QUERIES = {
+    "simcards_by_status": "SELECT status, '', COUNT(*) FROM simcards GROUP BY status",
+    "simcards_by_shop": "SELECT COALESCE(assignedTo, ''), status, COUNT(*) FROM simcards GROUP BY assignedTo, status",
+    "sales_by_day": "SELECT DATE(saleDate), '', COUNT(*) FROM simcards WHERE DATE(saleDate) IS NOT NULL GROUP BY DATE(saleDate)",
+    "shops_by_status": "SELECT status, '', COUNT(*) FROM shops GROUP BY status",
+    "shops_by_region": "SELECT region, '', COUNT(*) FROM shops GROUP BY region",
+}
+
+def _counter_upsert(name: str, key: str, subkey: str, delta: int, condition: Optional[str] = None) -> str:
+    """Trigger statement adding `delta` to one stat_counters row"""
+    where = f" WHERE {condition}" if condition else " WHERE 1"
+    return f"""
+            INSERT INTO stat_counters (name, key, subkey, value)
+            SELECT '{name}', {key}, {subkey}, {delta}{where}
+            ON CONFLICT (name, key, subkey) DO UPDATE SET value = value + excluded.value;"""
+
+def _migration_5_statistics_counters(conn):
+    """Summary counters kept up to date by triggers on every write"""
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stat_counters (
+            name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            subkey TEXT NOT NULL DEFAULT '',
+            value INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (name, key, subkey)
+        ) WITHOUT ROWID
+    """)
+    
+    def simcard_counters(row: str, delta: int, dimensions=("status", "shop", "sale")) -> str:
+        statements = ""
+        if "status" in dimensions:
+            statements += _counter_upsert("simcards_by_status", f"{row}.status", "''", delta)
+        if "shop" in dimensions:
+            statements += _counter_upsert("simcards_by_shop", f"COALESCE({row}.assignedTo, '')", f"{row}.status", delta)
+        if "sale" in dimensions:
+            statements += _counter_upsert("sales_by_day", f"DATE({row}.saleDate)", "''", delta,
+                                          f"DATE({row}.saleDate) IS NOT NULL")
+        return statements
+    
+    def shop_counters(row: str, delta: int, dimensions=("status", "region")) -> str:
+        statements = ""
+        if "status" in dimensions:
+            statements += _counter_upsert("shops_by_status", f"{row}.status", "''", delta)
+        if "region" in dimensions:
+            statements += _counter_upsert("shops_by_region", f"{row}.region", "''", delta)
+        return statements
+    
+    triggers = {
+        "trg_simcards_counters_insert": ("AFTER INSERT ON simcards", simcard_counters("NEW", 1)),
+        "trg_simcards_counters_delete": ("AFTER DELETE ON simcards", simcard_counters("OLD", -1)),
+        "trg_simcards_counters_status": (
+            "AFTER UPDATE OF status ON simcards WHEN OLD.status IS NOT NEW.status",
+            simcard_counters("OLD", -1, ("status",)) + simcard_counters("NEW", 1, ("status",))
+        ),
+        "trg_simcards_counters_shop": (
+            "AFTER UPDATE OF status, assignedTo ON simcards "
+            "WHEN OLD.status IS NOT NEW.status OR OLD.assignedTo IS NOT NEW.assignedTo",
+            simcard_counters("OLD", -1, ("shop",)) + simcard_counters("NEW", 1, ("shop",))
+        ),
+        "trg_simcards_counters_sale": (
+            "AFTER UPDATE OF saleDate ON simcards WHEN DATE(OLD.saleDate) IS NOT DATE(NEW.saleDate)",
+            simcard_counters("OLD", -1, ("sale",)) + simcard_counters("NEW", 1, ("sale",))
+        ),
+        "trg_shops_counters_insert": ("AFTER INSERT ON shops", shop_counters("NEW", 1)),
+        "trg_shops_counters_delete": ("AFTER DELETE ON shops", shop_counters("OLD", -1)),
+        "trg_shops_counters_update": (
+            "AFTER UPDATE OF status, region ON shops "
+            "WHEN OLD.status IS NOT NEW.status OR OLD.region IS NOT NEW.region",
+            shop_counters("OLD", -1) + shop_counters("NEW", 1)
+        ),
+    }
+    for trigger_name, (event, body) in triggers.items():
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger_name}")
+        cursor.execute(f"CREATE TRIGGER {trigger_name} {event} BEGIN{body}\n        END")
+    
+    _rebuild_stat_counters(conn)
+
+def _compute_stat_counters(conn) -> Dict[tuple, int]:
+    """Recompute all statistics counters from the base tables"""
+    counters = {}
+    for name, query in STAT_COUNTER_QUERIES.items():
+        for key, subkey, value in conn.execute(query).fetchall():
+            counters[(name, key, subkey)] = value
+    return counters
+
+def _rebuild_stat_counters(conn):
+    conn.execute("DELETE FROM stat_counters")
+    conn.executemany(
+        "INSERT INTO stat_counters (name, key, subkey, value) VALUES (?, ?, ?, ?)",
+        [(name, key, subkey, value) for (name, key, subkey), value in _compute_stat_counters(conn).items()]
+    )
+
+def verify_stat_counters(conn) -> List[Dict[str, Any]]:
+    """Compare stored counters with the base tables, returns mismatches"""
+    expected = _compute_stat_counters(conn)
+    stored = {
+        (row[0], row[1], row[2]): row[3]
+        for row in conn.execute("SELECT name, key, subkey, value FROM stat_counters WHERE value != 0").fetchall()
+    }
+    mismatches = []
+    for counter in sorted(set(expected) | set(stored)):
+        if expected.get(counter, 0) != stored.get(counter, 0):
+            name, key, subkey = counter
+            mismatches.append({
+                "name": name,
+                "key": key,
+                "subkey": subkey,
+                "expected": expected.get(counter, 0),
+                "stored": stored.get(counter, 0)
+            })
+    return mismatches
+
+def rebuild_stat_counters(conn) -> int:
+    """Rebuild all counters from the base tables in one transaction, returns counter rows"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _rebuild_stat_counters(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return conn.execute("SELECT COUNT(*) FROM stat_counters").fetchone()[0]
+
+def _migration_6_sweep_state(conn):
+    """Persistent background sweep progress and a staleness index"""
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sweep_state (
+            name TEXT PRIMARY KEY,
+            sweep_started_at TEXT,
+            checked INTEGER NOT NULL DEFAULT 0,
+            last_completed_at TEXT,
+            last_duration_ms REAL,
+            last_checked INTEGER
+        )
+    """)
+    # Assigned cards ordered by lastExternalCheck (NULLs, i.e. never checked, first)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_simcards_status_external_check ON simcards(status, lastExternalCheck)")
+
+def _migration_7_status_log_sequence(conn):
+    """Rebuild status_check_logs with a monotonic seq, used as the SSE event id"""
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        CREATE TABLE status_check_logs_new (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id TEXT NOT NULL UNIQUE,
+            simcard_id TEXT,
+            simcard_code TEXT,
+            old_status TEXT,
+            new_status TEXT,
+            source TEXT,
+            timestamp TEXT,
+            details TEXT
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO status_check_logs_new 
+        (id, simcard_id, simcard_code, old_status, new_status, source, timestamp, details)
+        SELECT id, simcard_id, simcard_code, old_status, new_status, source, timestamp, details
+        FROM status_check_logs ORDER BY timestamp, rowid
+    """)
+    cursor.execute("DROP TABLE status_check_logs")
+    cursor.execute("ALTER TABLE status_check_logs_new RENAME TO status_check_logs")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_status_logs_timestamp ON status_check_logs(timestamp)")
+
+def _migration_8_change_versions(conn):
+    """Monotonic change versions on simcards and shops, with tombstones for deletes"""
+    cursor = conn.cursor()
+    
+    # Single-row global version counter; tombstone_floor is the last pruned tombstone version
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sync_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL,
+            tombstone_floor INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO sync_state (id, version) VALUES (1, 1)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sync_tombstones (
+            version INTEGER PRIMARY KEY,
+            entity TEXT NOT NULL,
+            entity_id TEXT NOT NULL
+        )
+    """)
     
+    # Existing rows start at version 1
+    cursor.execute("ALTER TABLE simcards ADD COLUMN changeVersion INTEGER NOT NULL DEFAULT 1")
+    cursor.execute("ALTER TABLE shops ADD COLUMN changeVersion INTEGER NOT NULL DEFAULT 1")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_simcards_change_version ON simcards(changeVersion)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_shops_change_version ON shops(changeVersion)")
+    
+    bump = """
+            UPDATE sync_state SET version = version + 1 WHERE id = 1;"""
+    
+    def stamp(table: str) -> str:
+        return bump + f"""
+            UPDATE {table} SET changeVersion = (SELECT version FROM sync_state WHERE id = 1) WHERE rowid = NEW.rowid;"""
+    
+    def tombstone(entity: str) -> str:
+        return bump + f"""
+            INSERT INTO sync_tombstones (version, entity, entity_id) 
+            SELECT version, '{entity}', OLD.id FROM sync_state WHERE id = 1;"""
+    
+    # Check timestamps (lastChecked, lastExternalCheck, externalStatus) are not sync changes,
+    # otherwise every background sweep would make every card "changed"
+    simcard_columns = ("code", "status", "assignedTo", "assignedShopName", "saleDate")
+    old_values = ", ".join(f"OLD.{column}" for column in simcard_columns)
+    new_values = ", ".join(f"NEW.{column}" for column in simcard_columns)
+    
+    triggers = {
+        "trg_simcards_sync_insert": ("AFTER INSERT ON simcards", stamp("simcards")),
+        "trg_simcards_sync_update": (
+            f"AFTER UPDATE OF {', '.join(simcard_columns)} ON simcards "
+            f"WHEN ({old_values}) IS NOT ({new_values})",
+            stamp("simcards")
+        ),
+        "trg_simcards_sync_delete": ("AFTER DELETE ON simcards", tombstone("simcard")),
+        "trg_shops_sync_insert": ("AFTER INSERT ON shops", stamp("shops")),
+        "trg_shops_sync_update": ("AFTER UPDATE ON shops WHEN NEW.changeVersion IS OLD.changeVersion", stamp("shops")),
+        "trg_shops_sync_delete": ("AFTER DELETE ON shops", tombstone("shop")),
+    }
+    for trigger_name, (event, body) in triggers.items():
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger_name}")
+        cursor.execute(f"CREATE TRIGGER {trigger_name} {event} BEGIN{body}\n        END")
+
+def _migration_9_drop_sale_day(conn):
+    """Drop the saleDay column and its index, unused since sales are read from stat_counters"""
+    cursor = conn.cursor()
+    cursor.execute("DROP INDEX IF EXISTS idx_simcards_sale_day")
+    cursor.execute("ALTER TABLE simcards DROP COLUMN saleDay")
+
+def prune_sync_tombstones(conn, keep: int = SYNC_TOMBSTONES_KEPT) -> int:
+    """Drop all but the newest `keep` tombstones, returns deleted rows
+    
+    Clients syncing from a version below the new floor are told to reload.
+    """
+    row = conn.execute(
+        "SELECT version FROM sync_tombstones ORDER BY version DESC LIMIT 1 OFFSET ?", (keep,)
+    ).fetchone()
+    if row is None:
+        return 0
+    floor = row[0]
+    deleted = conn.execute("DELETE FROM sync_tombstones WHERE version <= ?", (floor,)).rowcount
+    conn.execute("UPDATE sync_state SET tombstone_floor = MAX(tombstone_floor, ?) WHERE id = 1", (floor,))
     conn.commit()
-    conn.close()
-    logger.info("Database initialized successfully!")
+    logger.info(f"Pruned {deleted} sync tombstones (floor version {floor})")
+    return deleted
+
+MIGRATIONS = [
+    (1, "base schema", _migration_1_base_schema),
+    (2, "hot-path indexes and saleDay column", _migration_2_hot_path_indexes),
+    (3, "list filter indexes", _migration_3_list_filter_indexes),
+    (4, "check history table", _migration_4_check_history_table),
+    (5, "statistics counters", _migration_5_statistics_counters),
+    (6, "sweep state", _migration_6_sweep_state),
+    (7, "status log sequence", _migration_7_status_log_sequence),
+    (8, "change versions", _migration_8_change_versions),
+    (9, "drop saleDay column", _migration_9_drop_sale_day),
+]
 
-def get_db():
-    """Get database connection"""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def run_migrations(conn) -> int:
+    """Upgrade the database in place to SCHEMA_VERSION, returns the resulting version"""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    if current >= SCHEMA_VERSION:
+        return current
+    
+    # Take the write lock first and re-read, in case another process migrated meanwhile
+    conn.execute("BEGIN IMMEDIATE")
     try:
-        yield conn
-    finally:
-        conn.close()
+        current = conn.execute("PRAGMA user_version").fetchone()[0]
+        for version, description, migrate in MIGRATIONS:
+            if version <= current:
+                continue
+            logger.info(f"Applying database migration {version}: {description}")
+            migrate(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            current = version
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    
+    return current
+
+# Endpoints and background tasks run their SQLite work through this layer:
+# reads on reader threads, write transactions on the single writer thread
+async_db = AsyncDatabase(DATABASE_NAME)
+
+# Shared external HTTP client, owned by the app lifecycle
+external_client: Optional[httpx.AsyncClient] = None
+external_requests_in_flight = 0
+
+def create_external_client() -> httpx.AsyncClient:
+    """Create pooled keep-alive HTTP client for the external status API"""
+    return httpx.AsyncClient(
+        base_url=EXTERNAL_API_BASE_URL,
+        timeout=httpx.Timeout(
+            EXTERNAL_API_TIMEOUT,
+            connect=EXTERNAL_API_CONNECT_TIMEOUT,
+            pool=EXTERNAL_API_POOL_TIMEOUT
+        ),
+        limits=httpx.Limits(
+            max_connections=EXTERNAL_API_MAX_CONNECTIONS,
+            max_keepalive_connections=EXTERNAL_API_MAX_KEEPALIVE,
+            keepalive_expiry=EXTERNAL_API_KEEPALIVE_EXPIRY
+        )
+    )
+
+def get_external_client() -> httpx.AsyncClient:
+    """Get shared external HTTP client (created lazily if startup did not run)"""
+    global external_client
+    if external_client is None or external_client.is_closed:
+        external_client = create_external_client()
+    return external_client
+
+async def close_external_client():
+    """Close shared external HTTP client and its pooled connections"""
+    global external_client
+    if external_client is not None:
+        await external_client.aclose()
+        external_client = None
+
+def external_pool_stats() -> Dict[str, Any]:
+    """Connection pool usage of the shared external HTTP client"""
+    stats = {
+        "maxConnections": EXTERNAL_API_MAX_CONNECTIONS,
+        "maxKeepalive": EXTERNAL_API_MAX_KEEPALIVE,
+        "requestsInFlight": external_requests_in_flight,
+        "connections": 0,
+        "inUse": 0,
+        "idle": 0,
+        "queued": 0
+    }
+    if external_client is None:
+        return stats
+    
+    # httpcore does not expose a public stats API, so read pool state defensively
+    pool = getattr(getattr(external_client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []) or [])
+    idle = sum(1 for connection in connections if connection.is_idle())
+    stats["connections"] = len(connections)
+    stats["idle"] = idle
+    stats["inUse"] = len(connections) - idle
+    stats["queued"] = sum(1 for request in list(getattr(pool, "_requests", []) or []) if request.is_queued())
+    return stats
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for the external status API
+    
+    closed: calls pass. After `failure_threshold` consecutive failures it opens
+    and calls fail fast; after `reset_timeout` seconds one probe call is let
+    through (half-open) and its outcome closes or re-opens the circuit.
+    """
+    
+    def __init__(self, failure_threshold: int = EXTERNAL_BREAKER_FAILURES, reset_timeout: float = EXTERNAL_BREAKER_RESET):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_in_flight = False
+        self.trips = 0
+        self.rejected = 0
+    
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self.probe_in_flight = False
+        if self.state == "half_open" and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+    
+    def allow_probe_soon(self) -> bool:
+        """Whether a call could be attempted now, without counting a rejection"""
+        return self.state != "open" or time.monotonic() - self.opened_at >= self.reset_timeout
+    
+    def record_success(self):
+        if self.state != "closed":
+            logger.info("External API recovered, closing circuit breaker")
+        self.state = "closed"
+        self.failures = 0
+        self.probe_in_flight = False
+    
+    def release_probe(self):
+        """Let another probe through after one ended without an outcome (e.g. it was cancelled)"""
+        self.probe_in_flight = False
+    
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+            if self.state == "closed":
+                self.trips += 1
+                logger.warning(f"External API failed {self.failures} times in a row, opening circuit breaker")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.probe_in_flight = False
+    
+    def stats(self) -> Dict[str, Any]:
+        retry_in = None
+        if self.state == "open":
+            retry_in = round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+        return {
+            "state": self.state,
+            "consecutiveFailures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "probeInSeconds": retry_in
+        }
+
+class ExternalAPIUnavailable(Exception):
+    """The external API could not be reached (circuit open or retries exhausted)"""
+
+external_breaker = CircuitBreaker()
+external_call_stats = {"attempts": 0, "retries": 0, "hedges": 0, "hedgeWins": 0}
+
+external_request_duration = REGISTRY.histogram(
+    "external_request_duration_seconds", "External status API call latency per attempt (hedged pair counts once)",
+    ("endpoint",)
+)
+external_requests = REGISTRY.counter(
+    "external_requests_total", "External status API attempts by outcome "
+    "(ok, http_4xx, http_5xx, timeout, connect_error, transport_error, circuit_open)",
+    ("endpoint", "outcome")
+)
 
-async def check_external_simcard_status(simcard_code: str) -> Dict[str, Any]:
-    """Check simcard status from external API"""
+def external_error_class(error: Exception) -> str:
+    if isinstance(error, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(error, httpx.ConnectError):
+        return "connect_error"
+    return "transport_error"
+
+def external_backoff(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    """Full-jitter exponential backoff, honouring a short Retry-After"""
+    if response is not None:
+        try:
+            return min(float(response.headers.get("retry-after", "")), EXTERNAL_API_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(EXTERNAL_API_BACKOFF_MAX, EXTERNAL_API_BACKOFF_BASE * (2 ** attempt)))
+
+async def send_hedged(path: str, payload: Dict[str, Any]) -> httpx.Response:
+    """POST once; with EXTERNAL_HEDGE_DELAY set, fire a second copy if the first is slow
+    
+    The first successful response wins and the other request is cancelled.
+    """
+    client = get_external_client()
+    if EXTERNAL_HEDGE_DELAY <= 0:
+        return await client.post(path, json=payload)
+    
+    first = asyncio.ensure_future(client.post(path, json=payload))
+    tasks = {first}
     try:
-        async with httpx.AsyncClient(timeout=EXTERNAL_API_TIMEOUT) as client:
-            response = await client.post(
-                f"{EXTERNAL_API_BASE_URL}/check-simcard-status",
-                json={"code": simcard_code}
-            )
-            
-            if response.status_code == 200:
-                return response.json()
+        done, _ = await asyncio.wait(tasks, timeout=EXTERNAL_HEDGE_DELAY)
+        if not done:
+            external_call_stats["hedges"] += 1
+            tasks.add(asyncio.ensure_future(client.post(path, json=payload)))
+        error = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.cancelled():
+                    error = error or asyncio.CancelledError()
+                    continue
+                if task.exception() is None:
+                    if task is not first:
+                        external_call_stats["hedgeWins"] += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in (first, *tasks):
+            if not task.done():
+                task.cancel()
+
+async def external_post(path: str, payload: Dict[str, Any]) -> httpx.Response:
+    """POST to the external API through the circuit breaker, retrying transient failures
+    
+    Connection errors, timeouts and EXTERNAL_API_RETRY_STATUSES are retried up
+    to EXTERNAL_API_RETRIES times with jittered backoff. Raises
+    ExternalAPIUnavailable when the circuit is open or every attempt failed
+    with a connection error; other responses are returned to the caller.
+    """
+    for attempt in range(EXTERNAL_API_RETRIES + 1):
+        if not external_breaker.allow():
+            external_requests.inc(path, "circuit_open")
+            raise ExternalAPIUnavailable("Circuit open: external API unavailable")
+        if attempt:
+            external_call_stats["retries"] += 1
+        external_call_stats["attempts"] += 1
+        
+        response = None
+        started = time.perf_counter()
+        try:
+            response = await send_hedged(path, payload)
+        except httpx.TransportError as e:
+            external_request_duration.observe(time.perf_counter() - started, path)
+            external_requests.inc(path, external_error_class(e))
+            external_breaker.record_failure()
+            if attempt == EXTERNAL_API_RETRIES:
+                raise ExternalAPIUnavailable(f"Connection error: {str(e) or type(e).__name__}")
+        except asyncio.CancelledError:
+            # A cancelled call says nothing about the API, but must not hold the half-open probe
+            external_breaker.release_probe()
+            raise
+        except Exception as e:
+            external_request_duration.observe(time.perf_counter() - started, path)
+            external_requests.inc(path, external_error_class(e))
+            external_breaker.record_failure()
+            raise
+        else:
+            external_request_duration.observe(time.perf_counter() - started, path)
+            external_requests.inc(path, "ok" if response.status_code < 400 else f"http_{response.status_code // 100}xx")
+            if response.status_code not in EXTERNAL_API_RETRY_STATUSES:
+                external_breaker.record_success()
+                return response
+            external_breaker.record_failure()
+            if attempt == EXTERNAL_API_RETRIES:
+                return response
+        
+        await asyncio.sleep(external_backoff(attempt, response))
+
+def external_error_result(message: str) -> Dict[str, Any]:
+    """Result used when the external API could not answer"""
+    return {
+        "status": "error",
+        "is_sold": False,
+        "sale_date": None,
+        "message": message
+    }
+
+class StatusResultCache:
+    """Bounded LRU cache of external status results keyed by simcard code
+    
+    Entries expire after the TTL configured for their status, so terminal
+    states (sold) live long and error results are never cached. Hits are
+    returned with "cached": true.
+    """
+    
+    def __init__(self, max_entries: int = STATUS_CACHE_MAX_ENTRIES, default_ttl: float = STATUS_CACHE_DEFAULT_TTL,
+                 ttls: Optional[Dict[str, float]] = None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.ttls = STATUS_CACHE_TTLS if ttls is None else ttls
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, code: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(code)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[code]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(code)
+        self.hits += 1
+        return {**entry[1], "cached": True}
+    
+    def put(self, code: str, result: Dict[str, Any]):
+        ttl = self.ttls.get(result.get("status"), self.default_ttl)
+        if ttl <= 0:
+            self._entries.pop(code, None)
+            return
+        self._entries[code] = (time.monotonic() + ttl, result)
+        self._entries.move_to_end(code)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "maxEntries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions
+        }
+
+status_result_cache = StatusResultCache()
+
+class SingleFlight:
+    """Coalesces concurrent external lookups of the same simcard code
+    
+    The first caller for a code (the leader) makes the external call; callers
+    arriving while it is in flight wait for the same result, which is marked
+    "coalesced": true so that only the leader records it in the database.
+    """
+    
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+    
+    async def lookup(self, codes: List[str], fetch) -> Dict[str, Dict[str, Any]]:
+        """Results for `codes`, calling `fetch(codes)` only for codes nobody else is fetching"""
+        shared = {code: self._in_flight[code] for code in codes if code in self._in_flight}
+        own = [code for code in dict.fromkeys(codes) if code not in shared]
+        results = {}
+        
+        if own:
+            loop = asyncio.get_running_loop()
+            futures = {code: loop.create_future() for code in own}
+            self._in_flight.update(futures)
+            self.leaders += len(own)
+            try:
+                fetched = await fetch(own)
+                for code, future in futures.items():
+                    future.set_result(fetched[code])
+                results.update(fetched)
+            finally:
+                for code, future in futures.items():
+                    if not future.done():
+                        future.set_result(external_error_result("Check was cancelled"))
+                    if self._in_flight.get(code) is future:
+                        del self._in_flight[code]
+        
+        for code, future in shared.items():
+            results[code] = {**await asyncio.shield(future), "coalesced": True}
+            self.coalesced += 1
+        return results
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "inFlight": len(self._in_flight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced
+        }
+
+external_singleflight = SingleFlight()
+
+async def check_external_simcard_status(simcard_code: str, force: bool = False) -> Dict[str, Any]:
+    """Check simcard status from external API (served from the result cache unless `force`)"""
+    results = await check_external_simcard_statuses([simcard_code], force)
+    return results[simcard_code]
+
+async def check_external_simcard_statuses(simcard_codes: List[str], force: bool = False) -> Dict[str, Dict[str, Any]]:
+    """Check simcard codes, looking up only result cache misses (all codes if `force`)
+    
+    Codes already being looked up by another caller share that call.
+    """
+    results = {}
+    misses = list(simcard_codes)
+    if not force:
+        misses = []
+        for code in simcard_codes:
+            cached = status_result_cache.get(code)
+            if cached is None:
+                misses.append(code)
             else:
-                logger.warning(f"External API returned status {response.status_code} for {simcard_code}")
-                return {
-                    "status": "error",
-                    "is_sold": False,
-                    "sale_date": None,
-                    "message": f"API error: {response.status_code}"
-                }
+                results[code] = cached
+    
+    if misses:
+        results.update(await external_singleflight.lookup(misses, fetch_and_cache_simcard_statuses))
+    return {code: results[code] for code in simcard_codes}
+
+async def fetch_and_cache_simcard_statuses(simcard_codes: List[str]) -> Dict[str, Dict[str, Any]]:
+    if len(simcard_codes) == 1:
+        fetched = {simcard_codes[0]: await fetch_external_simcard_status(simcard_codes[0])}
+    else:
+        fetched = await fetch_external_simcard_statuses(simcard_codes)
+    for code, result in fetched.items():
+        status_result_cache.put(code, result)
+    return fetched
+
+async def fetch_external_simcard_status(simcard_code: str) -> Dict[str, Any]:
+    """Check one simcard code with the single-check external endpoint"""
+    global external_requests_in_flight
+    external_requests_in_flight += 1
+    try:
+        response = await external_post("/check-simcard-status", {"code": simcard_code})
+        
+        if response.status_code == 200:
+            return response.json()
+        else:
+            logger.warning(f"External API returned status {response.status_code} for {simcard_code}")
+            return external_error_result(f"API error: {response.status_code}")
+    except ExternalAPIUnavailable as e:
+        return external_error_result(str(e))
     except Exception as e:
         logger.error(f"Error checking external API for {simcard_code}: {str(e)}")
-        return {
-            "status": "error",
-            "is_sold": False,
-            "sale_date": None,
-            "message": f"Connection error: {str(e)}"
-        }
+        return external_error_result(f"Connection error: {str(e)}")
+    finally:
+        external_requests_in_flight -= 1
 
-async def update_simcard_from_external_data(db, simcard_id: str, simcard_code: str, external_data: Dict[str, Any]):
-    """Update simcard in database based on external API response"""
-    cursor = db.cursor()
+# Per-code fallback requests in flight at once, across all batches; the semaphore
+# is created for the running loop, since asyncio primitives bind to the first one
+_external_fallback_limit: Optional[tuple] = None  # (loop, semaphore)
+
+def external_fallback_limit() -> asyncio.Semaphore:
+    global _external_fallback_limit
+    loop = asyncio.get_running_loop()
+    if _external_fallback_limit is None or _external_fallback_limit[0] is not loop:
+        _external_fallback_limit = (loop, asyncio.Semaphore(AUTO_CHECK_CONCURRENCY))
+    return _external_fallback_limit[1]
+
+async def fetch_external_simcard_status_limited(simcard_code: str) -> Dict[str, Any]:
+    async with external_fallback_limit():
+        return await fetch_external_simcard_status(simcard_code)
+
+async def fetch_external_simcard_statuses(simcard_codes: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Check one batch of simcard codes with a single external API call
     
-    # Get current simcard data
-    cursor.execute("SELECT * FROM simcards WHERE id = ?", (simcard_id,))
-    current_simcard = cursor.fetchone()
+    Falls back to per-code checks (at most AUTO_CHECK_CONCURRENCY at a time)
+    when the status API has no batch endpoint.
+    """
+    global external_requests_in_flight
+    if not simcard_codes:
+        return {}
     
-    if not current_simcard:
-        return False
+    external_requests_in_flight += 1
+    try:
+        response = await external_post("/bulk-check-simcards", {"codes": simcard_codes})
+        
+        if response.status_code == 200:
+            results = response.json().get("results", {})
+            return {
+                code: results.get(code) or external_error_result("Missing from batch response")
+                for code in simcard_codes
+            }
+        elif response.status_code in (404, 405):
+            logger.warning("External API has no batch endpoint, falling back to single checks")
+        else:
+            logger.warning(f"External API returned status {response.status_code} for batch of {len(simcard_codes)}")
+            return {code: external_error_result(f"API error: {response.status_code}") for code in simcard_codes}
+    except ExternalAPIUnavailable as e:
+        logger.warning(f"External API unavailable for batch of {len(simcard_codes)}: {e}")
+        return {code: external_error_result(str(e)) for code in simcard_codes}
+    except Exception as e:
+        logger.error(f"Error checking external API for batch of {len(simcard_codes)}: {str(e)}")
+        return {code: external_error_result(f"Connection error: {str(e)}") for code in simcard_codes}
+    finally:
+        external_requests_in_flight -= 1
     
+    results = await asyncio.gather(*(fetch_external_simcard_status_limited(code) for code in simcard_codes))
+    return dict(zip(simcard_codes, results))
+
+def build_simcard_update(current_simcard, external_data: Dict[str, Any], checked_at: str) -> Dict[str, Any]:
+    """Compute new simcard fields from external API response"""
     current_status = current_simcard["status"]
     new_status = current_status
     sale_date = current_simcard["saleDate"]
@@ -171,58 +1021,471 @@ async def update_simcard_from_external_data(db, simcard_id: str, simcard_code: s
         if not sale_date and external_data.get("sale_date"):
             sale_date = external_data["sale_date"]
         elif not sale_date:
-            sale_date = datetime.now().isoformat()
-    
-    # Prepare check history
-    check_history = json.loads(current_simcard["checkHistory"] or "[]")
-    check_history.append({
-        "timestamp": datetime.now().isoformat(),
-        "external_status": external_data.get("status"),
-        "is_sold": external_data.get("is_sold", False),
-        "message": external_data.get("message", "")
-    })
-    
-    # Keep only last 10 history entries
-    if len(check_history) > 10:
-        check_history = check_history[-10:]
-    
-    # Update simcard
-    cursor.execute("""
+            sale_date = checked_at
+    
+    # Cached and coalesced results are not recorded again, so they keep the stored check time
+    recorded_elsewhere = external_data.get("cached") or external_data.get("coalesced")
+    
+    return {
+        "id": current_simcard["id"],
+        "code": current_simcard["code"],
+        "oldStatus": current_status,
+        "status": new_status,
+        "saleDate": sale_date,
+        "checkedAt": checked_at,
+        "lastChecked": current_simcard["lastChecked"] if recorded_elsewhere else checked_at,
+        "externalStatus": external_data.get("status"),
+        "externalData": external_data
+    }
+
+def apply_simcard_updates(db, checks) -> List[Dict[str, Any]]:
+    """Apply external check results to the database in a single transaction
+    
+    `checks` is a list of (current simcard row, external data) pairs.
+    """
+    checked_at = datetime.now().isoformat()
+    updates = [build_simcard_update(simcard, external_data, checked_at) for simcard, external_data in checks]
+    if not updates:
+        return updates
+    
+    # Cached and coalesced results were already recorded by whoever fetched them:
+    # only fresh results update check timestamps and history
+    fresh = [u for u in updates if not (u["externalData"].get("cached") or u["externalData"].get("coalesced"))]
+    
+    cursor = db.cursor()
+    cursor.executemany("""
         UPDATE simcards 
-        SET status = ?, saleDate = ?, lastChecked = ?, lastExternalCheck = ?, 
-            externalStatus = ?, checkHistory = ?
+        SET lastChecked = ?, lastExternalCheck = ?, externalStatus = ?
         WHERE id = ?
-    """, (
-        new_status,
-        sale_date,
-        datetime.now().isoformat(),
-        datetime.now().isoformat(),
-        external_data.get("status"),
-        json.dumps(check_history),
-        simcard_id
-    ))
-    
-    # Log status change if status changed
-    if current_status != new_status:
-        cursor.execute("""
-            INSERT INTO status_check_logs 
-            (id, simcard_id, simcard_code, old_status, new_status, source, timestamp, details)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            str(uuid.uuid4()),
-            simcard_id,
-            simcard_code,
-            current_status,
-            new_status,
-            "external_api",
-            datetime.now().isoformat(),
-            json.dumps(external_data)
-        ))
-        
-        logger.info(f"SimCard {simcard_code} status changed from {current_status} to {new_status}")
+    """, [
+        (checked_at, checked_at, u["externalStatus"], u["id"])
+        for u in fresh
+    ])
+    
+    # Cached and coalesced results still resolved the card's status now, so they move
+    # lastExternalCheck (the sweep's progress marker) and the card is not re-picked
+    cursor.executemany("""
+        UPDATE simcards SET lastExternalCheck = ?
+        WHERE id = ? AND (lastExternalCheck IS NULL OR lastExternalCheck < ?)
+    """, [
+        (checked_at, u["id"], checked_at)
+        for u in updates
+        if u["externalStatus"] != "error" and (u["externalData"].get("cached") or u["externalData"].get("coalesced"))
+    ])
+    
+    # Status changes (and the sale date that comes with them) only apply if the row still
+    # has the status they were computed from, so concurrent checks of one card change
+    # (and log) it once and a rejected change leaves no sale behind
+    changed = []
+    for u in updates:
+        if u["oldStatus"] == u["status"]:
+            # A card that is already sold may still lack its sale date
+            if u["status"] == "sold" and u["saleDate"]:
+                cursor.execute("UPDATE simcards SET saleDate = ? WHERE id = ? AND status = 'sold' AND saleDate IS NULL",
+                               (u["saleDate"], u["id"]))
+            continue
+        cursor.execute("UPDATE simcards SET status = ?, saleDate = ? WHERE id = ? AND status IS ?",
+                       (u["status"], u["saleDate"], u["id"], u["oldStatus"]))
+        if cursor.rowcount:
+            changed.append(u)
+    
+    # Append check history (single INSERT per entry) and prune old entries in bulk
+    cursor.executemany("""
+        INSERT INTO simcard_check_history (simcard_id, timestamp, external_status, is_sold, message)
+        VALUES (?, ?, ?, ?, ?)
+    """, [
+        (u["id"], checked_at, u["externalStatus"], 1 if u["externalData"].get("is_sold", False) else 0,
+         u["externalData"].get("message", ""))
+        for u in fresh
+    ])
+    prune_check_history(db, [u["id"] for u in fresh])
+    
+    # Log status changes
+    cursor.executemany("""
+        INSERT INTO status_check_logs 
+        (id, simcard_id, simcard_code, old_status, new_status, source, timestamp, details)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (str(uuid.uuid4()), u["id"], u["code"], u["oldStatus"], u["status"],
+         "external_api", checked_at, json.dumps(u["externalData"]))
+        for u in changed
+    ])
     
     db.commit()
-    return True
+    if changed:
+        status_events.notify()
+    
+    for u in changed:
+        logger.info(f"SimCard {u['code']} status changed from {u['oldStatus']} to {u['status']}")
+    
+    return updates
+
+def prune_check_history(db, simcard_ids: Optional[List[str]] = None, retention: Optional[int] = None,
+                        chunk_size: int = 500) -> int:
+    """Delete history entries beyond the per-simcard retention, returns deleted rows
+    
+    Prunes the given simcards, or every simcard when `simcard_ids` is None.
+    """
+    retention = CHECK_HISTORY_RETENTION if retention is None else retention
+    cursor = db.cursor()
+    prune_sql = """
+        DELETE FROM simcard_check_history WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (PARTITION BY simcard_id ORDER BY id DESC) AS rn
+                FROM simcard_check_history {where}
+            ) WHERE rn > ?
+        )
+    """
+    if simcard_ids is None:
+        cursor.execute(prune_sql.format(where=""), (retention,))
+        return cursor.rowcount
+    
+    deleted = 0
+    for start in range(0, len(simcard_ids), chunk_size):
+        chunk = simcard_ids[start:start + chunk_size]
+        placeholders = ", ".join("?" for _ in chunk)
+        cursor.execute(prune_sql.format(where=f"WHERE simcard_id IN ({placeholders})"), chunk + [retention])
+        deleted += cursor.rowcount
+    return deleted
+
+def load_check_history(db, simcard_ids: List[str], limit: Optional[int] = None,
+                       chunk_size: int = 500) -> Dict[str, List[Dict[str, Any]]]:
+    """Load check history (oldest first) for many simcards, keyed by simcard id"""
+    history = {simcard_id: [] for simcard_id in simcard_ids}
+    cursor = db.cursor()
+    for start in range(0, len(simcard_ids), chunk_size):
+        chunk = simcard_ids[start:start + chunk_size]
+        placeholders = ", ".join("?" for _ in chunk)
+        cursor.execute(f"""
+            SELECT simcard_id, timestamp, external_status, is_sold, message
+            FROM simcard_check_history
+            WHERE simcard_id IN ({placeholders})
+            ORDER BY simcard_id, id
+        """, chunk)
+        for row in cursor.fetchall():
+            history[row["simcard_id"]].append({
+                "timestamp": row["timestamp"],
+                "external_status": row["external_status"],
+                "is_sold": bool(row["is_sold"]),
+                "message": row["message"]
+            })
+    if limit is not None:
+        history = {simcard_id: entries[-limit:] if limit else [] for simcard_id, entries in history.items()}
+    return history
+
+def simcard_to_dict(db, simcard, include_history: bool = False) -> Dict[str, Any]:
+    """Serialize a simcard row, attaching check history only on request"""
+    result = {field: simcard[field] for field in SIMCARD_COLUMNS}
+    if include_history:
+        result["checkHistory"] = load_check_history(db, [simcard["id"]])[simcard["id"]]
+    return result
+
+def load_simcard(db, simcard_id: str, include_history: bool = False) -> Optional[Dict[str, Any]]:
+    """One simcard as a dict, or None if it does not exist"""
+    simcard = db.execute("SELECT * FROM simcards WHERE id = ?", (simcard_id,)).fetchone()
+    return simcard_to_dict(db, simcard, include_history) if simcard else None
+
+def fetch_simcards_by_ids(db, simcard_ids: List[str], chunk_size: int = 500) -> Dict[str, Any]:
+    """Load simcards by id in chunks, keyed by id"""
+    cursor = db.cursor()
+    rows = {}
+    for start in range(0, len(simcard_ids), chunk_size):
+        chunk = simcard_ids[start:start + chunk_size]
+        placeholders = ", ".join("?" for _ in chunk)
+        cursor.execute(f"SELECT * FROM simcards WHERE id IN ({placeholders})", chunk)
+        for row in cursor.fetchall():
+            rows[row["id"]] = row
+    return rows
+
+def write_status_batch(db, checks, synchronous: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Apply one group commit of check results, optionally at its own synchronous level"""
+    if synchronous is None:
+        return apply_simcard_updates(db, checks)
+    previous = db.execute("PRAGMA synchronous").fetchone()[0]
+    db.execute(f"PRAGMA synchronous = {synchronous}")
+    try:
+        return apply_simcard_updates(db, checks)
+    finally:
+        db.execute(f"PRAGMA synchronous = {previous}")
+
+status_write_batch_size = REGISTRY.histogram(
+    "status_write_batch_checks", "External check results written per group commit",
+    buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000)
+)
+
+class StatusWriteQueue:
+    """Write-behind queue that group-commits external check results
+    
+    Check-status, auto-check and the sweep submit (simcard row, external data)
+    pairs and get a future for the resulting updates. A single flusher task
+    writes whatever is queued in one transaction on the writer thread once
+    `batch_size` checks are waiting or the oldest has waited `max_delay`
+    seconds, so checks that arrive during a commit share the next one.
+    A submission is never split between transactions. With durability
+    "full" every group commit is synced to disk (synchronous=FULL).
+    """
+    
+    def __init__(self, batch_size: int = STATUS_WRITE_BATCH_SIZE, max_delay: float = STATUS_WRITE_MAX_DELAY,
+                 max_pending: int = STATUS_WRITE_MAX_PENDING, durability: str = STATUS_WRITE_DURABILITY):
+        self.batch_size = max(1, batch_size)
+        self.max_delay = max(0.0, max_delay)
+        self.max_pending = max(self.batch_size, max_pending)
+        self.durability = "full" if durability == "full" else "normal"
+        self._pending = deque()  # (checks, future)
+        self._queued = 0
+        self._oldest = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._wakeup: Optional[asyncio.Event] = None
+        self._full: Optional[asyncio.Event] = None
+        self._space: Optional[asyncio.Event] = None
+        self.commits = 0
+        self.written = 0
+        self.failures = 0
+        self.largest = 0
+        self.commit_seconds = 0.0
+    
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            # Events are bound to the running loop, so they are created with the flusher
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._full = asyncio.Event()
+            self._space = asyncio.Event()
+            self._space.set()
+            if self._pending:
+                self._wakeup.set()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def submit(self, checks) -> asyncio.Future:
+        """Queue checks for the next group commit; the future resolves to their updates"""
+        self._ensure_started()
+        while self._queued >= self.max_pending:
+            self._space.clear()
+            await self._space.wait()
+        future = asyncio.get_running_loop().create_future()
+        checks = list(checks)
+        if not checks:
+            future.set_result([])
+            return future
+        if not self._pending:
+            self._oldest = time.monotonic()
+        self._pending.append((checks, future))
+        self._queued += len(checks)
+        self._wakeup.set()
+        if self._queued >= self.batch_size:
+            self._full.set()
+        return future
+    
+    async def write(self, checks) -> List[Dict[str, Any]]:
+        """Queue checks and wait until they are committed"""
+        return await (await self.submit(checks))
+    
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            delay = self._oldest + self.max_delay - time.monotonic()
+            if not self._stopping and self._queued < self.batch_size and delay > 0:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+            await self._flush_batch()
+            if not self._pending:
+                if self._stopping:
+                    return
+                self._wakeup.clear()
+    
+    async def _flush_batch(self):
+        batch = []
+        count = 0
+        while self._pending and count < self.batch_size:
+            checks, future = self._pending.popleft()
+            batch.append((checks, future))
+            count += len(checks)
+        if not batch:
+            return
+        self._queued -= count
+        if self._queued < self.max_pending:
+            self._space.set()
+        
+        started = time.perf_counter()
+        try:
+            updates = await async_db.write(write_status_batch, [check for checks, _ in batch for check in checks],
+                                           "FULL" if self.durability == "full" else None)
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Status write of {count} checks failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.commit_seconds += time.perf_counter() - started
+        self.commits += 1
+        self.written += count
+        self.largest = max(self.largest, count)
+        status_write_batch_size.observe(count)
+        
+        offset = 0
+        for checks, future in batch:
+            if not future.done():
+                future.set_result(updates[offset:offset + len(checks)])
+            offset += len(checks)
+    
+    async def stop(self):
+        """Write everything still queued and stop the flusher"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self._full.set()
+        try:
+            await self._task
+        finally:
+            self._task = None
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queued,
+            "commits": self.commits,
+            "written": self.written,
+            "failures": self.failures,
+            "largestBatch": self.largest,
+            "avgBatch": round(self.written / self.commits, 1) if self.commits else 0.0,
+            "avgCommitMs": round(self.commit_seconds * 1000 / self.commits, 2) if self.commits else 0.0,
+            "batchSize": self.batch_size,
+            "maxDelayMs": round(self.max_delay * 1000, 1),
+            "durability": self.durability
+        }
+
+status_writer = StatusWriteQueue()
+
+class AutoCheckEngine:
+    """Bounded-parallel external status checker with group-committed DB updates
+    
+    Codes are grouped into batches of `external_batch_size` for the bulk
+    lookup endpoint and looked up by `concurrency` workers; finished checks
+    go to the status write queue without waiting for their commit.
+    """
+    
+    def __init__(self, concurrency: int = AUTO_CHECK_CONCURRENCY, external_batch_size: int = EXTERNAL_API_BATCH_SIZE,
+                 rate_limiter: Optional["TokenBucket"] = None):
+        self.concurrency = max(1, concurrency)
+        self.external_batch_size = max(1, external_batch_size)
+        self.rate_limiter = rate_limiter
+    
+    async def run(self, simcard_ids: List[str], force: bool = False) -> Dict[str, Any]:
+        """Check the given simcards; sold cards are skipped and cached results reused unless `force`"""
+        started = time.perf_counter()
+        timestamp = datetime.now().isoformat()
+        stats = {
+            "concurrency": self.concurrency,
+            "requested": len(simcard_ids),
+            "checked": 0,
+            "externalCalls": 0,
+            "externalTotalMs": 0.0,
+            "externalMaxMs": 0.0,
+            "dbReadMs": 0.0,
+            "dbWriteMs": 0.0,
+            "skippedSold": 0,
+            "cacheHits": 0,
+        }
+        
+        # Load all requested simcards up front (one query per chunk, not per card)
+        db_started = time.perf_counter()
+        rows = await async_db.read(fetch_simcards_by_ids, list(dict.fromkeys(i for i in simcard_ids if i)))
+        stats["dbReadMs"] = (time.perf_counter() - db_started) * 1000
+        
+        # Sold is terminal: those cards are not checked again unless forced
+        row_list = [row for row in rows.values() if force or row["status"] != "sold"]
+        stats["skippedSold"] = len(rows) - len(row_list)
+        
+        # Group codes into batches for the external bulk lookup endpoint
+        queue: asyncio.Queue = asyncio.Queue()
+        for start in range(0, len(row_list), self.external_batch_size):
+            queue.put_nowait(row_list[start:start + self.external_batch_size])
+        
+        writes = []
+        
+        async def worker():
+            while True:
+                try:
+                    batch = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.acquire(len(batch))
+                check_started = time.perf_counter()
+                external_results = await check_external_simcard_statuses([simcard["code"] for simcard in batch], force)
+                elapsed = (time.perf_counter() - check_started) * 1000
+                hits = sum(1 for result in external_results.values() if result.get("cached"))
+                stats["cacheHits"] += hits
+                if hits < len(batch):
+                    stats["externalCalls"] += 1
+                stats["externalTotalMs"] += elapsed
+                stats["externalMaxMs"] = max(stats["externalMaxMs"], elapsed)
+                stats["checked"] += len(batch)
+                writes.append(await status_writer.submit(
+                    (simcard, external_results[simcard["code"]]) for simcard in batch
+                ))
+        
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, queue.qsize()) or 1)))
+        
+        # dbWriteMs is how long the run waited for its last group commits after the lookups
+        write_started = time.perf_counter()
+        updates = {update["id"]: update for written in await asyncio.gather(*writes) for update in written}
+        stats["dbWriteMs"] = (time.perf_counter() - write_started) * 1000
+        
+        results = []
+        newly_sold = []
+        for simcard_id in simcard_ids:
+            update = updates.get(simcard_id)
+            if not update:
+                if simcard_id in rows and rows[simcard_id]["status"] == "sold":
+                    row = rows[simcard_id]
+                    results.append({
+                        "simCardId": simcard_id,
+                        "status": "sold",
+                        "isSold": True,
+                        "saleDate": row["saleDate"],
+                        "lastChecked": row["lastChecked"],
+                        "externalStatus": row["externalStatus"],
+                        "statusChanged": False,
+                        "skipped": True
+                    })
+                continue
+            if update["oldStatus"] != "sold" and update["status"] == "sold":
+                newly_sold.append({
+                    "id": simcard_id,
+                    "code": update["code"],
+                    "shopName": rows[simcard_id]["assignedShopName"]
+                })
+            results.append({
+                "simCardId": simcard_id,
+                "status": update["status"],
+                "isSold": update["status"] == "sold",
+                "saleDate": update["saleDate"],
+                "lastChecked": update["lastChecked"],
+                "externalStatus": update["externalStatus"],
+                "statusChanged": update["oldStatus"] != update["status"],
+                "cached": bool(update["externalData"].get("cached"))
+            })
+        
+        duration = time.perf_counter() - started
+        stats["durationMs"] = duration * 1000
+        stats["externalAvgMs"] = stats["externalTotalMs"] / stats["externalCalls"] if stats["externalCalls"] else 0.0
+        stats["checksPerSecond"] = stats["checked"] / duration if duration > 0 else 0.0
+        for key, value in stats.items():
+            if isinstance(value, float):
+                stats[key] = round(value, 2)
+        
+        return {
+            "results": results,
+            "timestamp": timestamp,
+            "newlySold": newly_sold,
+            "stats": stats
+        }
 
 # Pydantic models
 class LoginRequest(BaseModel):
@@ -261,16 +1524,307 @@ class AssignSimCardsRequest(BaseModel):
     shopId: str
     count: int
 
+class MultiShopAssignRequest(BaseModel):
+    shopIds: List[str]
+    count: int  # total number of cards, distributed evenly across shops
+    allowPartial: bool = False
+
+class AutoCheckJobRequest(BaseModel):
+    scope: str = "all"  # all | shop | region
+    shopId: Optional[str] = None
+    region: Optional[str] = None
+    concurrency: Optional[int] = None
+    force: bool = False  # bypass the status result cache
+
 class BulkSimCardCreate(BaseModel):
     codes: List[str]
 
+# List pagination, filtering and projection
+SIMCARD_COLUMNS = ("id", "code", "status", "assignedTo", "assignedShopName", "addedDate", "saleDate",
+                   "lastChecked", "lastExternalCheck", "externalStatus", "changeVersion")
+SIMCARD_FIELDS = SIMCARD_COLUMNS + ("checkHistory",)  # checkHistory is loaded from simcard_check_history
+SHOP_FIELDS = ("id", "name", "ownerName", "ownerPhone", "address", "latitude", "longitude",
+               "status", "region", "assignedSimCards", "addedDate", "changeVersion")
+LIST_DEFAULT_LIMIT = 100
+LIST_MAX_LIMIT = 1000
+
+def parse_fields(fields: Optional[str], allowed: tuple, default: Optional[tuple] = None) -> List[str]:
+    """Parse a comma-separated `fields=` projection against allowed columns"""
+    if not fields:
+        return list(default or allowed)
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in selected if field not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return selected
+
+def encode_cursor(added_date: str, row_id: str) -> str:
+    """Opaque keyset cursor for (addedDate, id)"""
+    return base64.urlsafe_b64encode(json.dumps([added_date, row_id]).encode()).decode()
+
+def added_before_clause(date_to: str):
+    """WHERE clause and parameter for an inclusive dateTo filter on addedDate
+    
+    A date without a time part covers that whole day: rows are compared
+    against the start of the next day.
+    """
+    if re.fullmatch(r"\d{4}-\d{2}-\d{2}", date_to):
+        try:
+            next_day = datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid dateTo")
+        return "addedDate < ?", next_day.strftime("%Y-%m-%d")
+    return "addedDate <= ?", date_to
+
+def decode_cursor(cursor: str):
+    try:
+        added_date, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(added_date), str(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def fetch_keyset_page(db, table: str, fields: List[str], where: List[str], params: List[Any],
+                      limit: Optional[int], cursor: Optional[str]):
+    """Fetch rows ordered by (addedDate, id) DESC, optionally one keyset page at a time
+    
+    Returns (rows, next_cursor); without limit/cursor all matching rows are returned.
+    """
+    where = list(where)
+    params = list(params)
+    if cursor:
+        where.append("(addedDate, id) < (?, ?)")
+        params.extend(decode_cursor(cursor))
+    
+    # Always select the keyset columns, even when not projected
+    columns = list(dict.fromkeys(fields + ["addedDate", "id"]))
+    sql = f"SELECT {', '.join(columns)} FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY addedDate DESC, id DESC"
+    
+    paginated = limit is not None or cursor is not None
+    if paginated:
+        limit = max(1, min(limit or LIST_DEFAULT_LIMIT, LIST_MAX_LIMIT))
+        sql += " LIMIT ?"
+        params.append(limit + 1)
+    
+    db_cursor = db.cursor()
+    db_cursor.execute(sql, params)
+    rows = db_cursor.fetchall()
+    
+    next_cursor = None
+    if paginated and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["addedDate"], rows[-1]["id"])
+    return rows, next_cursor
+
+def list_response(items: List[Dict[str, Any]], next_cursor: Optional[str], paginated: bool):
+    """Plain list for legacy callers, page envelope when paginating"""
+    if not paginated:
+        return items
+    return {"items": items, "nextCursor": next_cursor}
+
+# Versioned response cache for read-heavy endpoints
+class DataVersion:
+    """Database version used to invalidate cached responses
+    
+    Combines a local counter bumped after every commit of the async DB writer
+    that changed rows with SQLite's PRAGMA data_version, read on a dedicated
+    connection, which changes whenever any other connection (or the status
+    API process) commits. current() blocks, so it runs on a reader thread.
+    """
+    
+    def __init__(self):
+        self.local = 0
+        self._probe = None
+        self._lock = threading.Lock()
+    
+    def bump(self):
+        with self._lock:
+            self.local += 1
+    
+    def current(self) -> tuple:
+        with self._lock:
+            if self._probe is None:
+                self._probe = connect(DATABASE_NAME)
+            return (self.local, self._probe.execute("PRAGMA data_version").fetchone()[0])
+    
+    def close(self):
+        with self._lock:
+            if self._probe is not None:
+                self._probe.close()
+                self._probe = None
+
+class ResponseCache:
+    """LRU + TTL cache of serialized responses, valid for one data version"""
+    
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl: float = RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+    
+    def get(self, key: tuple, version: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+    
+    def put(self, key: tuple, version: tuple, body: bytes, headers: Dict[str, str], route=None):
+        entry = (version, time.monotonic() + self.ttl, body, headers, route)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "ttlSeconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRatio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "notModified": self.not_modified,
+                "evictions": self.evictions
+            }
+
+data_version = DataVersion()
+async_db.on_commit = data_version.bump
+response_cache = ResponseCache()
+
+# GET routes served through the response cache
+CACHED_ROUTES = [
+    re.compile(r"^/statistics$"),
+    re.compile(r"^/statistics/shops$"),
+    re.compile(r"^/shops$"),
+    re.compile(r"^/shops/[^/]+/stats$"),
+]
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+def cached_response(request: Request, entry) -> Response:
+    _, _, body, headers, _ = entry
+    if etag_matches(request, headers["ETag"]):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+class ResponseCacheMiddleware:
+    """ASGI middleware serving CACHED_ROUTES GET responses from the response cache
+    
+    Other requests pass straight through, so streaming responses (SSE, export)
+    are never buffered. Entries are keyed by path and query and are only
+    valid for the data version they were rendered at. Each entry keeps the
+    matched route, which is put back in the scope on a hit so request
+    metrics are labelled with the real route template.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] != "GET"
+                or not any(route.match(scope["path"]) for route in CACHED_ROUTES)):
+            await self.app(scope, receive, send)
+            return
+        
+        request = Request(scope)
+        key = (scope["path"], tuple(sorted(request.query_params.multi_items())))
+        version = await async_db.run(data_version.current)
+        entry = response_cache.get(key, version)
+        if entry is not None:
+            _, expires, body, headers, route = entry
+            if route is not None:
+                scope["route"] = route
+            response = cached_response(request, (version, expires, body, {**headers, "X-Cache": "HIT"}, route))
+            await response(scope, receive, send)
+            return
+        
+        # Render the route, holding its messages back until we know it can be cached
+        messages = []
+        
+        async def capture(message):
+            messages.append(message)
+        
+        await self.app(scope, receive, capture)
+        if not messages or messages[0]["type"] != "http.response.start" or messages[0]["status"] != 200:
+            for message in messages:
+                await send(message)
+            return
+        
+        body = b"".join(message.get("body", b"") for message in messages[1:] if message["type"] == "http.response.body")
+        headers = {
+            "ETag": '"' + hashlib.sha1(body).hexdigest() + '"',
+            "Cache-Control": "no-cache",
+            "X-Cache": "MISS"
+        }
+        entry = response_cache.put(key, version, body, headers, scope.get("route"))
+        await cached_response(request, entry)(scope, receive, send)
+
+app.add_middleware(ResponseCacheMiddleware)
+
+@app.get("/admin/cache")
+async def get_cache_stats():
+    """Response cache hit/miss counters"""
+    return {**response_cache.stats(), "dataVersion": list(await async_db.run(data_version.current))}
+
+QUERY_SORT_FIELDS = ("total", "avg", "max", "calls", "rows")
+
+@app.get("/admin/queries/top")
+async def get_top_queries(limit: int = 20, sort: str = "total"):
+    """Top normalized SQL statements by time, plus recent slow queries with their plans"""
+    if sort not in QUERY_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(QUERY_SORT_FIELDS)}")
+    return {
+        **query_tracer.stats(),
+        "statements": query_tracer.top(max(1, min(limit, 200)), sort),
+        "slowQueries": query_tracer.slow_queries()
+    }
+
+@app.post("/admin/queries/tracing")
+async def set_query_tracing(enabled: bool, reset: bool = False):
+    """Switch SQL statement tracing on or off (connections pick it up on their next cursor)"""
+    query_tracer.enabled = enabled
+    if reset:
+        query_tracer.reset()
+    return query_tracer.stats()
+
+@app.delete("/admin/queries")
+async def reset_query_stats():
+    """Clear collected statement statistics and the slow-query log"""
+    query_tracer.reset()
+    return query_tracer.stats()
+
 # Auth endpoints
 @app.post("/auth/login")
-async def login(request: LoginRequest, db = Depends(get_db)):
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM users WHERE username = ? AND password = ?", 
-                   (request.username, request.password))
-    user = cursor.fetchone()
+async def login(request: LoginRequest):
+    user = await async_db.fetch_one("SELECT * FROM users WHERE username = ? AND password = ?", 
+                                    (request.username, request.password))
     
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -291,21 +1845,37 @@ async def logout():
 
 # Shop endpoints
 @app.get("/shops")
-async def get_shops(db = Depends(get_db)):
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM shops ORDER BY addedDate DESC")
-    shops = cursor.fetchall()
+async def get_shops(limit: Optional[int] = None, cursor: Optional[str] = None, status: Optional[str] = None,
+                    region: Optional[str] = None, dateFrom: Optional[str] = None, dateTo: Optional[str] = None,
+                    fields: Optional[str] = None):
+    selected = parse_fields(fields, SHOP_FIELDS)
+    where, params = [], []
+    if status:
+        where.append("status = ?")
+        params.append(status)
+    if region:
+        where.append("region = ?")
+        params.append(region)
+    if dateFrom:
+        where.append("addedDate >= ?")
+        params.append(dateFrom)
+    if dateTo:
+        clause, value = added_before_clause(dateTo)
+        where.append(clause)
+        params.append(value)
+    
+    shops, next_cursor = await async_db.read(fetch_keyset_page, "shops", selected, where, params, limit, cursor)
     
     result = []
     for shop in shops:
-        shop_dict = dict(shop)
-        shop_dict["assignedSimCards"] = json.loads(shop_dict["assignedSimCards"])
+        shop_dict = {field: shop[field] for field in selected}
+        if "assignedSimCards" in shop_dict:
+            shop_dict["assignedSimCards"] = json.loads(shop_dict["assignedSimCards"])
         result.append(shop_dict)
     
-    return result
+    return list_response(result, next_cursor, limit is not None or cursor is not None)
 
-@app.post("/shops")
-async def create_shop(shop: ShopCreate, db = Depends(get_db)):
+def insert_shop(db, shop: ShopCreate) -> Dict[str, Any]:
     shop_id = str(uuid.uuid4())
     cursor = db.cursor()
     
@@ -316,8 +1886,6 @@ async def create_shop(shop: ShopCreate, db = Depends(get_db)):
     """, (shop_id, shop.name, shop.ownerName, shop.ownerPhone, shop.address,
           shop.latitude, shop.longitude, "active", shop.region, "[]", datetime.now().isoformat()))
     
-    db.commit()
-    
     # Return created shop
     cursor.execute("SELECT * FROM shops WHERE id = ?", (shop_id,))
     created_shop = cursor.fetchone()
@@ -326,8 +1894,11 @@ async def create_shop(shop: ShopCreate, db = Depends(get_db)):
     
     return shop_dict
 
-@app.put("/shops/{shop_id}")
-async def update_shop(shop_id: str, shop: ShopUpdate, db = Depends(get_db)):
+@app.post("/shops")
+async def create_shop(shop: ShopCreate):
+    return await async_db.write(insert_shop, shop)
+
+def save_shop_update(db, shop_id: str, shop: ShopUpdate) -> Dict[str, Any]:
     cursor = db.cursor()
     
     # Check if shop exists
@@ -359,7 +1930,6 @@ async def update_shop(shop_id: str, shop: ShopUpdate, db = Depends(get_db)):
         set_clause = ", ".join([f"{key} = ?" for key in update_fields.keys()])
         values = list(update_fields.values()) + [shop_id]
         cursor.execute(f"UPDATE shops SET {set_clause} WHERE id = ?", values)
-        db.commit()
     
     # Return updated shop
     cursor.execute("SELECT * FROM shops WHERE id = ?", (shop_id,))
@@ -369,8 +1939,11 @@ async def update_shop(shop_id: str, shop: ShopUpdate, db = Depends(get_db)):
     
     return shop_dict
 
-@app.delete("/shops/{shop_id}")
-async def delete_shop(shop_id: str, db = Depends(get_db)):
+@app.put("/shops/{shop_id}")
+async def update_shop(shop_id: str, shop: ShopUpdate):
+    return await async_db.write(save_shop_update, shop_id, shop)
+
+def remove_shop(db, shop_id: str):
     cursor = db.cursor()
     
     # Check if shop exists
@@ -384,12 +1957,13 @@ async def delete_shop(shop_id: str, db = Depends(get_db)):
     
     # Update assigned simcards
     cursor.execute("UPDATE simcards SET status = 'available', assignedTo = NULL, assignedShopName = NULL WHERE assignedTo = ?", (shop_id,))
-    
-    db.commit()
+
+@app.delete("/shops/{shop_id}")
+async def delete_shop(shop_id: str):
+    await async_db.write(remove_shop, shop_id)
     return {"success": True}
 
-@app.get("/shops/{shop_id}/stats")
-async def get_shop_stats(shop_id: str, db = Depends(get_db)):
+def read_shop_stats(db, shop_id: str) -> Dict[str, Any]:
     cursor = db.cursor()
     
     # Check if shop exists
@@ -419,69 +1993,110 @@ async def get_shop_stats(shop_id: str, db = Depends(get_db)):
     
     return result
 
+@app.get("/shops/{shop_id}/stats")
+async def get_shop_stats(shop_id: str):
+    return await async_db.read(read_shop_stats, shop_id)
+
 # SimCard endpoints
 @app.get("/simcards")
-async def get_simcards(db = Depends(get_db)):
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM simcards ORDER BY addedDate DESC")
-    simcards = cursor.fetchall()
+async def get_simcards(limit: Optional[int] = None, cursor: Optional[str] = None, status: Optional[str] = None,
+                       shopId: Optional[str] = None, region: Optional[str] = None, dateFrom: Optional[str] = None,
+                       dateTo: Optional[str] = None, fields: Optional[str] = None, includeHistory: bool = False):
+    selected = parse_fields(fields, SIMCARD_FIELDS, default=SIMCARD_COLUMNS)
+    include_history = includeHistory or "checkHistory" in selected
+    selected = [field for field in selected if field != "checkHistory"]
+    where, params = [], []
+    if status:
+        where.append("status = ?")
+        params.append(status)
+    if shopId:
+        where.append("assignedTo = ?")
+        params.append(shopId)
+    if region:
+        where.append("assignedTo IN (SELECT id FROM shops WHERE region = ?)")
+        params.append(region)
+    if dateFrom:
+        where.append("addedDate >= ?")
+        params.append(dateFrom)
+    if dateTo:
+        clause, value = added_before_clause(dateTo)
+        where.append(clause)
+        params.append(value)
+    
+    def read_page(db):
+        simcards, next_cursor = fetch_keyset_page(db, "simcards", selected, where, params, limit, cursor)
+        # Load check history only when it was requested (one query per page)
+        history = load_check_history(db, [simcard["id"] for simcard in simcards]) if include_history else {}
+        return simcards, next_cursor, history
+    
+    simcards, next_cursor, history = await async_db.read(read_page)
     
     result = []
     for simcard in simcards:
-        simcard_dict = dict(simcard)
-        # Parse check history if exists
-        try:
-            simcard_dict["checkHistory"] = json.loads(simcard_dict["checkHistory"] or "[]")  
-        except:
-            simcard_dict["checkHistory"] = []
+        simcard_dict = {field: simcard[field] for field in selected}
+        if include_history:
+            simcard_dict["checkHistory"] = history[simcard["id"]]
         result.append(simcard_dict)
     
-    return result
+    return list_response(result, next_cursor, limit is not None or cursor is not None)
 
-@app.post("/simcards")
-async def create_simcard(simcard: SimCardCreate, db = Depends(get_db)):
+def insert_simcard(db, code: str) -> Dict[str, Any]:
     simcard_id = str(uuid.uuid4())
-    cursor = db.cursor()
+    db.execute("""
+        INSERT INTO simcards 
+        (id, code, status, assignedTo, assignedShopName, addedDate, saleDate, lastChecked, lastExternalCheck, externalStatus, checkHistory)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (simcard_id, code, "available", None, None, datetime.now().isoformat(), None, None, None, None, "[]"))
     
+    # Return created simcard
+    return load_simcard(db, simcard_id)
+
+@app.post("/simcards")
+async def create_simcard(simcard: SimCardCreate):
     try:
-        cursor.execute("""
-            INSERT INTO simcards 
-            (id, code, status, assignedTo, assignedShopName, addedDate, saleDate, lastChecked, lastExternalCheck, externalStatus, checkHistory)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (simcard_id, simcard.code, "available", None, None, datetime.now().isoformat(), None, None, None, None, "[]"))
-        
-        db.commit()
-        
-        # Return created simcard
-        cursor.execute("SELECT * FROM simcards WHERE id = ?", (simcard_id,))
-        created_simcard = cursor.fetchone()
-        result = dict(created_simcard)
-        result["checkHistory"] = json.loads(result["checkHistory"] or "[]")
-        
-        return result
+        return await async_db.write(insert_simcard, simcard.code)
     except sqlite3.IntegrityError:
         raise HTTPException(status_code=400, detail="SimCard code already exists")
 
+def insert_new_simcards(cursor, codes: List[str], added_date: str) -> List[Dict[str, str]]:
+    """Insert codes not yet in the database with one executemany, returns created cards"""
+    cards = [{"id": str(uuid.uuid4()), "code": code} for code in codes]
+    cursor.executemany("""
+        INSERT OR IGNORE INTO simcards 
+        (id, code, status, assignedTo, assignedShopName, addedDate, saleDate, lastChecked, lastExternalCheck, externalStatus, checkHistory)
+        VALUES (?, ?, 'available', NULL, NULL, ?, NULL, NULL, NULL, NULL, '[]')
+    """, [(card["id"], card["code"], added_date) for card in cards])
+    return cards
+
+def find_existing_codes(cursor, codes: List[str], chunk_size: int = 500) -> set:
+    """Set-based lookup of codes that already exist"""
+    existing = set()
+    for start in range(0, len(codes), chunk_size):
+        chunk = codes[start:start + chunk_size]
+        placeholders = ", ".join("?" for _ in chunk)
+        cursor.execute(f"SELECT code FROM simcards WHERE code IN ({placeholders})", chunk)
+        existing.update(row[0] for row in cursor.fetchall())
+    return existing
+
+def insert_missing_simcards(db, codes: List[str]):
+    """Insert the codes that do not exist yet, returns (created cards, existing codes)"""
+    cursor = db.cursor()
+    existing = find_existing_codes(cursor, codes)
+    created_cards = insert_new_simcards(cursor, [code for code in codes if code not in existing], datetime.now().isoformat())
+    return created_cards, existing
+
 @app.post("/simcards/bulk")
-async def create_bulk_simcards(request: BulkSimCardCreate, db = Depends(get_db)):
+async def create_bulk_simcards(request: BulkSimCardCreate):
     """Create multiple simcards at once"""
-    cursor = db.cursor()
-    created_cards = []
-    failed_cards = []
+    created_cards, existing = await async_db.write(insert_missing_simcards, list(dict.fromkeys(request.codes)))
     
+    # Codes that already existed, and repeats within the request, are reported as failed
+    failed_cards = []
+    seen = set()
     for code in request.codes:
-        try:
-            simcard_id = str(uuid.uuid4())
-            cursor.execute("""
-                INSERT INTO simcards 
-                (id, code, status, assignedTo, assignedShopName, addedDate, saleDate, lastChecked, lastExternalCheck, externalStatus, checkHistory)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (simcard_id, code, "available", None, None, datetime.now().isoformat(), None, None, None, None, "[]"))
-            created_cards.append({"id": simcard_id, "code": code})
-        except sqlite3.IntegrityError:
+        if code in existing or code in seen:
             failed_cards.append({"code": code, "reason": "Code already exists"})
-    
-    db.commit()
+        seen.add(code)
     
     return {
         "success": True,
@@ -491,8 +2106,198 @@ async def create_bulk_simcards(request: BulkSimCardCreate, db = Depends(get_db))
         "failed_cards": failed_cards
     }
 
-@app.put("/simcards/{simcard_id}")
-async def update_simcard(simcard_id: str, simcard: SimCardUpdate, db = Depends(get_db)):
+class CodeStreamParser:
+    """Incrementally split an uploaded CSV or newline-separated byte stream into codes
+    
+    The code is the first CSV column; an optional header line ("code") is skipped.
+    """
+    
+    HEADER_NAMES = ("code", "codes", "kod", "simcard", "simcard_code")
+    
+    def __init__(self):
+        self._remainder = b""
+        self._first_line = True
+    
+    def feed(self, chunk: bytes) -> List[str]:
+        lines = (self._remainder + chunk).split(b"\n")
+        self._remainder = lines.pop()
+        return self._parse(lines)
+    
+    def close(self) -> List[str]:
+        lines, self._remainder = [self._remainder], b""
+        return self._parse(lines)
+    
+    def _parse(self, lines: List[bytes]) -> List[str]:
+        codes = []
+        for raw in lines:
+            line = raw.decode("utf-8-sig" if self._first_line else "utf-8", errors="replace").strip()
+            if not line:
+                continue
+            first_line, self._first_line = self._first_line, False
+            code = next(csv.reader([line]), [""])[0].strip() if ("," in line or '"' in line) else line
+            if not code or (first_line and code.lower() in self.HEADER_NAMES):
+                continue
+            codes.append(code)
+        return codes
+
+class SimCardImport:
+    """Set-based bulk import of simcard codes through a temporary staging table
+    
+    Codes are staged (deduplicated by the staging primary key), then the ones
+    not yet in `simcards` are read back chunk by chunk for insertion on the
+    async DB writer. Runs on its own connection so the temp table never leaks
+    into the pool; it only ever writes to that temp table.
+    """
+    
+    def __init__(self, chunk_size: int = IMPORT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.conn = connect(DATABASE_NAME)
+        self.conn.execute("CREATE TEMP TABLE import_staging (code TEXT PRIMARY KEY) WITHOUT ROWID")
+        self.received = 0
+        self.staged = 0
+    
+    def stage(self, codes: List[str]):
+        cursor = self.conn.cursor()
+        cursor.executemany("INSERT OR IGNORE INTO import_staging (code) VALUES (?)", [(code,) for code in codes])
+        self.received += len(codes)
+        self.staged += cursor.rowcount
+        self.conn.commit()
+    
+    def write_conflicts(self, path: str):
+        """Write codes that already exist in simcards to a CSV file"""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT s.code FROM import_staging s
+            WHERE EXISTS (SELECT 1 FROM simcards c WHERE c.code = s.code)
+            ORDER BY s.code
+        """)
+        with open(path, "w", newline="", encoding="utf-8") as conflicts_file:
+            writer = csv.writer(conflicts_file)
+            writer.writerow(["code", "reason"])
+            while True:
+                rows = cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                writer.writerows((row[0], "Code already exists") for row in rows)
+    
+    def next_new_codes(self, after: str) -> List[str]:
+        """Next chunk of staged codes (ordered, after `after`) missing from simcards"""
+        cursor = self.conn.execute("""
+            SELECT s.code FROM import_staging s
+            WHERE s.code > ? AND NOT EXISTS (SELECT 1 FROM simcards c WHERE c.code = s.code)
+            ORDER BY s.code
+            LIMIT ?
+        """, (after, self.chunk_size))
+        return [row[0] for row in cursor.fetchall()]
+    
+    async def insert_new(self) -> int:
+        """Insert staged codes missing from simcards, one writer transaction per chunk"""
+        created = 0
+        codes = await async_db.run(self.next_new_codes, "")
+        while codes:
+            created += await async_db.write(insert_import_chunk, codes)
+            codes = await async_db.run(self.next_new_codes, codes[-1])
+        return created
+    
+    def close(self):
+        self.conn.close()
+
+def insert_import_chunk(db, codes: List[str]) -> int:
+    cursor = db.cursor()
+    insert_new_simcards(cursor, codes, datetime.now().isoformat())
+    return cursor.rowcount
+
+# Conflict lists of recent imports, downloadable by import id
+import_conflict_files: "OrderedDict[str, str]" = OrderedDict()
+
+def remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def remember_conflict_file(import_id: str, path: str):
+    import_conflict_files[import_id] = path
+    while len(import_conflict_files) > IMPORT_CONFLICT_FILES_KEPT:
+        _, old_path = import_conflict_files.popitem(last=False)
+        remove_file(old_path)
+
+def remove_conflict_files():
+    """Delete every remembered conflict list (called at shutdown)"""
+    while import_conflict_files:
+        _, path = import_conflict_files.popitem(last=False)
+        remove_file(path)
+
+async def iter_upload_chunks(request: Request):
+    """Yield raw bytes of a multipart `file` upload or of a plain streamed body"""
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Multipart upload must contain a 'file' field")
+        while True:
+            chunk = await upload.read(IMPORT_READ_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        async for chunk in request.stream():
+            yield chunk
+
+@app.post("/simcards/import")
+async def import_simcards(request: Request, returnConflicts: bool = False):
+    """Bulk import simcard codes from a streamed CSV / newline upload"""
+    started = time.perf_counter()
+    import_id = str(uuid.uuid4())
+    importer = await async_db.run(SimCardImport)
+    
+    try:
+        parser = CodeStreamParser()
+        batch = []
+        async for chunk in iter_upload_chunks(request):
+            batch.extend(parser.feed(chunk))
+            if len(batch) >= importer.chunk_size:
+                await async_db.run(importer.stage, batch)
+                batch = []
+        batch.extend(parser.close())
+        if batch:
+            await async_db.run(importer.stage, batch)
+        
+        conflicts_url = None
+        if returnConflicts:
+            path = os.path.join(tempfile.gettempdir(), f"simcard-import-{import_id}-conflicts.csv")
+            await async_db.run(importer.write_conflicts, path)
+            remember_conflict_file(import_id, path)
+            conflicts_url = f"/simcards/import/{import_id}/conflicts"
+        
+        created = await importer.insert_new()
+    finally:
+        await async_db.run(importer.close)
+    
+    duration = time.perf_counter() - started
+    logger.info(f"Import {import_id}: {importer.received} rows, {created} created in {duration:.2f}s")
+    
+    return {
+        "success": True,
+        "importId": import_id,
+        "received": importer.received,
+        "duplicatesInFile": importer.received - importer.staged,
+        "created": created,
+        "conflicts": importer.staged - created,
+        "conflictsUrl": conflicts_url,
+        "durationMs": round(duration * 1000, 2),
+        "rowsPerSecond": round(importer.received / duration, 2) if duration > 0 else 0.0
+    }
+
+@app.get("/simcards/import/{import_id}/conflicts")
+async def get_import_conflicts(import_id: str):
+    """Download the conflict list of a recent import as CSV"""
+    path = import_conflict_files.get(import_id)
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Conflict list not found")
+    return FileResponse(path, media_type="text/csv", filename=f"import-{import_id}-conflicts.csv")
+
+def save_simcard_update(db, simcard_id: str, simcard: SimCardUpdate, include_history: bool) -> Dict[str, Any]:
     cursor = db.cursor()
     
     # Check if simcard exists
@@ -518,18 +2323,15 @@ async def update_simcard(simcard_id: str, simcard: SimCardUpdate, db = Depends(g
         set_clause = ", ".join([f"{key} = ?" for key in update_fields.keys()])
         values = list(update_fields.values()) + [simcard_id]
         cursor.execute(f"UPDATE simcards SET {set_clause} WHERE id = ?", values)
-        db.commit()
     
     # Return updated simcard
-    cursor.execute("SELECT * FROM simcards WHERE id = ?", (simcard_id,))
-    updated_simcard = cursor.fetchone()
-    result = dict(updated_simcard)
-    result["checkHistory"] = json.loads(result["checkHistory"] or "[]")
-    
-    return result
+    return load_simcard(db, simcard_id, include_history)
 
-@app.delete("/simcards/{simcard_id}")
-async def delete_simcard(simcard_id: str, db = Depends(get_db)):
+@app.put("/simcards/{simcard_id}")
+async def update_simcard(simcard_id: str, simcard: SimCardUpdate, includeHistory: bool = False):
+    return await async_db.write(save_simcard_update, simcard_id, simcard, includeHistory)
+
+def remove_simcard(db, simcard_id: str):
     cursor = db.cursor()
     
     # Check if simcard exists
@@ -538,14 +2340,49 @@ async def delete_simcard(simcard_id: str, db = Depends(get_db)):
     if not simcard:
         raise HTTPException(status_code=404, detail="SimCard not found")
     
-    # Delete simcard
+    # Delete simcard and its check history
     cursor.execute("DELETE FROM simcards WHERE id = ?", (simcard_id,))
-    db.commit()
-    
+    cursor.execute("DELETE FROM simcard_check_history WHERE simcard_id = ?", (simcard_id,))
+
+@app.delete("/simcards/{simcard_id}")
+async def delete_simcard(simcard_id: str):
+    await async_db.write(remove_simcard, simcard_id)
     return {"success": True}
 
-@app.post("/simcards/assign")
-async def assign_simcards_to_shop(request: AssignSimCardsRequest, db = Depends(get_db)):
+def assign_available_simcards(cursor, shop_id: str, shop_name: str, count: int) -> List[Dict[str, Any]]:
+    """Assign up to `count` available simcards (oldest first) with one UPDATE ... RETURNING
+    
+    Must run inside a write transaction (BEGIN IMMEDIATE) so no other writer
+    can grab the same cards between selection and update.
+    """
+    if count <= 0:
+        return []
+    cursor.execute("""
+        UPDATE simcards 
+        SET status = 'assigned', assignedTo = ?, assignedShopName = ?
+        WHERE id IN (
+            SELECT id FROM simcards WHERE status = 'available' ORDER BY addedDate, id LIMIT ?
+        )
+        RETURNING id, code
+    """, (shop_id, shop_name, count))
+    return [
+        {
+            "id": row["id"],
+            "code": row["code"],
+            "status": "assigned",
+            "assignedTo": shop_id,
+            "assignedShopName": shop_name
+        }
+        for row in cursor.fetchall()
+    ]
+
+def count_available_simcards(cursor, limit: int) -> int:
+    cursor.execute("SELECT COUNT(*) FROM (SELECT 1 FROM simcards WHERE status = 'available' LIMIT ?)", (limit,))
+    return cursor.fetchone()[0]
+
+def assign_to_shop(db, request: AssignSimCardsRequest) -> List[Dict[str, Any]]:
+    if request.count <= 0:
+        raise HTTPException(status_code=400, detail="Count must be positive")
     cursor = db.cursor()
     
     # Check if shop exists
@@ -554,159 +2391,388 @@ async def assign_simcards_to_shop(request: AssignSimCardsRequest, db = Depends(g
     if not shop:
         raise HTTPException(status_code=404, detail="Shop not found")
     
-    # Get available simcards
-    cursor.execute("SELECT * FROM simcards WHERE status = 'available' LIMIT ?", (request.count,))
-    available_simcards = cursor.fetchall()
-    
-    if len(available_simcards) < request.count:
-        raise HTTPException(status_code=400, detail=f"Only {len(available_simcards)} simcards available")
-    
-    # Assign simcards
-    assigned_cards = []
-    for simcard in available_simcards:
-        cursor.execute("""
-            UPDATE simcards 
-            SET status = 'assigned', assignedTo = ?, assignedShopName = ?
-            WHERE id = ?
-        """, (request.shopId, shop["name"], simcard["id"]))
-        
-        assigned_cards.append({
-            "id": simcard["id"],
-            "code": simcard["code"],
-            "status": "assigned",
-            "assignedTo": request.shopId,
-            "assignedShopName": shop["name"]
-        })
-    
-    db.commit()
+    # Count and assign under one immediate write lock, so concurrent
+    # assignments (also from other processes) can never pick the same cards;
+    # the writer thread commits, or rolls back if this raises
+    cursor.execute("BEGIN IMMEDIATE")
+    available = count_available_simcards(cursor, request.count)
+    if available < request.count:
+        raise HTTPException(status_code=400, detail=f"Only {available} simcards available")
     
+    return assign_available_simcards(cursor, request.shopId, shop["name"], request.count)
+
+@app.post("/simcards/assign")
+async def assign_simcards_to_shop(request: AssignSimCardsRequest):
+    if request.count <= 0:
+        raise HTTPException(status_code=400, detail="Count must be positive")
+    assigned_cards = await async_db.write(assign_to_shop, request)
     return {
         "success": True,
+        "requested": request.count,
+        "assigned": len(assigned_cards),
         "assignedCards": assigned_cards
     }
 
-@app.get("/simcards/{simcard_id}/check-status")
-async def check_simcard_status(simcard_id: str, background_tasks: BackgroundTasks, db = Depends(get_db)):
-    """Check single simcard status from external API"""
+def assign_to_shops(db, shop_ids: List[str], request: MultiShopAssignRequest) -> List[Dict[str, Any]]:
+    if request.count <= 0:
+        raise HTTPException(status_code=400, detail="Count must be positive")
     cursor = db.cursor()
-    cursor.execute("SELECT * FROM simcards WHERE id = ?", (simcard_id,))
-    simcard = cursor.fetchone()
+    placeholders = ", ".join("?" for _ in shop_ids)
+    cursor.execute(f"SELECT id, name FROM shops WHERE id IN ({placeholders})", shop_ids)
+    shop_names = {row["id"]: row["name"] for row in cursor.fetchall()}
+    missing = [shop_id for shop_id in shop_ids if shop_id not in shop_names]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Shops not found: {', '.join(missing)}")
+    
+    cursor.execute("BEGIN IMMEDIATE")
+    available = count_available_simcards(cursor, request.count)
+    if available < request.count and not request.allowPartial:
+        raise HTTPException(status_code=400, detail=f"Only {available} simcards available")
+    
+    # Even split of what can actually be assigned; the first shops take the remainder
+    total = min(available, request.count)
+    share, remainder = divmod(total, len(shop_ids))
+    shops = []
+    for index, shop_id in enumerate(shop_ids):
+        cards = assign_available_simcards(cursor, shop_id, shop_names[shop_id], share + (1 if index < remainder else 0))
+        shops.append({
+            "shopId": shop_id,
+            "shopName": shop_names[shop_id],
+            "assigned": len(cards),
+            "assignedCards": cards
+        })
+    return shops
+
+@app.post("/simcards/assign/bulk")
+async def assign_simcards_to_shops(request: MultiShopAssignRequest):
+    """Distribute `count` available simcards evenly across several shops in one transaction"""
+    shop_ids = list(dict.fromkeys(request.shopIds))
+    if not shop_ids:
+        raise HTTPException(status_code=400, detail="At least one shop is required")
+    if request.count <= 0:
+        raise HTTPException(status_code=400, detail="Count must be positive")
+    
+    shops = await async_db.write(assign_to_shops, shop_ids, request)
+    return {
+        "success": True,
+        "requested": request.count,
+        "assigned": sum(shop["assigned"] for shop in shops),
+        "shops": shops
+    }
+
+@app.get("/simcards/{simcard_id}/check-status")
+async def check_simcard_status(simcard_id: str, background_tasks: BackgroundTasks, includeHistory: bool = False,
+                               force: bool = False):
+    """Check single simcard status from external API
+    
+    Sold cards are not re-checked and recent results come from the status
+    result cache; `force=true` always asks the external API.
+    """
+    simcard = await async_db.read(load_simcard, simcard_id, includeHistory)
     
     if not simcard:
         raise HTTPException(status_code=404, detail="SimCard not found")
     
-    # Check external API
-    external_data = await check_external_simcard_status(simcard["code"])
+    if simcard["status"] == "sold" and not force:
+        result = simcard
+        result["externalData"] = {
+            "status": simcard["externalStatus"],
+            "is_sold": True,
+            "sale_date": simcard["saleDate"],
+            "skipped": True,
+            "message": "Sold simcards are not re-checked (use force=true)"
+        }
+        return result
     
-    # Update database with external data
-    await update_simcard_from_external_data(db, simcard_id, simcard["code"], external_data)
+    # Check external API
+    external_data = await check_external_simcard_status(simcard["code"], force)
     
-    # Get updated simcard
-    cursor.execute("SELECT * FROM simcards WHERE id = ?", (simcard_id,))
-    updated_simcard = cursor.fetchone()
-    result = dict(updated_simcard)
-    result["checkHistory"] = json.loads(result["checkHistory"] or "[]")
+    # Record the check with the next group commit and return the updated simcard
+    await status_writer.write([(simcard, external_data)])
+    result = await async_db.read(load_simcard, simcard_id, includeHistory)
+    if not result:
+        raise HTTPException(status_code=404, detail="SimCard not found")
     result["externalData"] = external_data
     
     return result
 
+def read_simcard_history(db, simcard_id: str, limit: Optional[int]) -> List[Dict[str, Any]]:
+    cursor = db.cursor()
+    cursor.execute("SELECT id FROM simcards WHERE id = ?", (simcard_id,))
+    if not cursor.fetchone():
+        raise HTTPException(status_code=404, detail="SimCard not found")
+    
+    return load_check_history(db, [simcard_id], limit)[simcard_id]
+
+@app.get("/simcards/{simcard_id}/history")
+async def get_simcard_history(simcard_id: str, limit: Optional[int] = None):
+    """Check history of a single simcard (oldest first)"""
+    return await async_db.read(read_simcard_history, simcard_id, limit)
+
 @app.post("/simcards/auto-check")
-async def auto_check_simcards(request: Dict[str, Any], background_tasks: BackgroundTasks, db = Depends(get_db)):
+async def auto_check_simcards(request: Dict[str, Any], background_tasks: BackgroundTasks):
     """Auto check all simcards from external API"""
     simcards = request.get("simCards", [])
-    cursor = db.cursor()
-    
-    results = []
-    timestamp = datetime.now().isoformat()
-    newly_sold = []
+    try:
+        concurrency = min(int(request.get("concurrency") or AUTO_CHECK_CONCURRENCY), AUTO_CHECK_MAX_CONCURRENCY)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="concurrency must be an integer")
+    force = bool(request.get("force", False))
     
-    logger.info(f"Starting auto-check for {len(simcards)} simcards")
+    logger.info(f"Starting auto-check for {len(simcards)} simcards (concurrency={concurrency})")
     
-    for simcard_data in simcards:
-        simcard_id = simcard_data.get("id")
-        
-        # Get current simcard from database
-        cursor.execute("SELECT * FROM simcards WHERE id = ?", (simcard_id,))
-        simcard = cursor.fetchone()
-        
-        if simcard:
-            old_status = simcard["status"]
-            
-            # Check external API
-            external_data = await check_external_simcard_status(simcard["code"])
-            
-            # Update database with external data
-            await update_simcard_from_external_data(db, simcard_id, simcard["code"], external_data)
-            
-            # Get updated status
-            cursor.execute("SELECT * FROM simcards WHERE id = ?", (simcard_id,))
-            updated_simcard = cursor.fetchone()
-            new_status = updated_simcard["status"]
-            
-            # Track newly sold simcards
-            if old_status != "sold" and new_status == "sold":
-                newly_sold.append({
-                    "id": simcard_id,
-                    "code": simcard["code"],
-                    "shopName": simcard["assignedShopName"]
-                })
-            
-            results.append({
-                "simCardId": simcard_id,
-                "status": new_status,
-                "isSold": new_status == "sold",
-                "saleDate": updated_simcard["saleDate"],
-                "lastChecked": timestamp,
-                "externalStatus": external_data.get("status"),
-                "statusChanged": old_status != new_status
-            })
+    engine = AutoCheckEngine(concurrency=concurrency)
+    run = await engine.run([simcard_data.get("id") for simcard_data in simcards], force)
     
-    logger.info(f"Auto-check completed. Found {len(newly_sold)} newly sold simcards")
+    logger.info(f"Auto-check completed. Found {len(run['newlySold'])} newly sold simcards "
+                f"in {run['stats']['durationMs']:.0f} ms")
     
     return {
-        "results": results,
-        "timestamp": timestamp,
-        "newlySold": newly_sold,
-        "totalChecked": len(simcards)
+        "results": run["results"],
+        "timestamp": run["timestamp"],
+        "newlySold": run["newlySold"],
+        "totalChecked": len(simcards),
+        "stats": run["stats"]
     }
 
-# Statistics endpoints
-@app.get("/statistics")
-async def get_statistics(db = Depends(get_db)):
-    cursor = db.cursor()
-    
-    # Shop statistics
-    cursor.execute("SELECT COUNT(*) as total FROM shops")
-    total_shops = cursor.fetchone()["total"]
-    
-    cursor.execute("SELECT COUNT(*) as active FROM shops WHERE status = 'active'")
-    active_shops = cursor.fetchone()["active"]
-    
-    # SimCard statistics
-    cursor.execute("SELECT COUNT(*) as total FROM simcards")
-    total_simcards = cursor.fetchone()["total"]
-    
-    cursor.execute("SELECT COUNT(*) as available FROM simcards WHERE status = 'available'")
-    available_simcards = cursor.fetchone()["available"]
-    
-    cursor.execute("SELECT COUNT(*) as assigned FROM simcards WHERE status = 'assigned'")
-    assigned_simcards = cursor.fetchone()["assigned"]
+# Auto-check jobs
+class AutoCheckJob:
+    """Background auto-check over a scope of assigned simcards, polled for progress"""
+    
+    def __init__(self, scope: str, value: Optional[str], simcard_ids: List[str], concurrency: int, force: bool = False):
+        self.id = str(uuid.uuid4())
+        self.force = force
+        self.scope = scope
+        self.value = value
+        self.simcard_ids = simcard_ids
+        self.concurrency = concurrency
+        self.status = "queued"
+        self.checked = 0
+        self.results: List[Dict[str, Any]] = []
+        self.newly_sold: List[Dict[str, Any]] = []
+        self.skipped = 0  # cards already being checked by another job
+        self.merged_with: List[str] = []  # jobs checking the skipped cards
+        self.external_calls = 0
+        self.created_at = datetime.now().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.finished_monotonic: Optional[float] = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+    
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+    
+    def finish(self, status: str):
+        """Mark the job finished and release the cards it still holds"""
+        self.status = status
+        for simcard_id in self.simcard_ids:
+            if claimed_simcards.get(simcard_id) == self.id:
+                del claimed_simcards[simcard_id]
+        self.finished_at = datetime.now().isoformat()
+        self.finished_monotonic = time.monotonic()
+        status_events.publish("auto-check-job", {
+            "jobId": self.id,
+            "status": self.status,
+            "total": len(self.simcard_ids),
+            "checked": self.checked,
+            "newlySold": len(self.newly_sold),
+            "finishedAt": self.finished_at
+        })
     
-    cursor.execute("SELECT COUNT(*) as sold FROM simcards WHERE status = 'sold'")
-    sold_simcards = cursor.fetchone()["sold"]
+    def covers(self, scope: str, value: Optional[str]) -> bool:
+        return self.scope == "all" or (self.scope == scope and self.value == value)
     
-    # Region statistics
-    cursor.execute("SELECT region, COUNT(*) as count FROM shops GROUP BY region")
-    region_stats_result = cursor.fetchall()
-    region_stats = {row["region"]: row["count"] for row in region_stats_result}
+    def to_dict(self, since: int = 0) -> Dict[str, Any]:
+        since = max(0, since)
+        total = len(self.simcard_ids)
+        return {
+            "jobId": self.id,
+            "scope": self.scope,
+            "shopId": self.value if self.scope == "shop" else None,
+            "region": self.value if self.scope == "region" else None,
+            "status": self.status,
+            "total": total,
+            "checked": self.checked,
+            "skipped": self.skipped,
+            "mergedWith": self.merged_with,
+            "progress": round(self.checked / total, 4) if total else 1.0,
+            "createdAt": self.created_at,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+            "results": self.results[since:],
+            "nextIndex": len(self.results),
+            "newlySold": self.newly_sold,
+            "externalCalls": self.external_calls,
+            "error": self.error
+        }
+
+auto_check_jobs: "OrderedDict[str, AutoCheckJob]" = OrderedDict()
+# simcard id -> id of the active job currently checking it
+claimed_simcards: Dict[str, str] = {}
+
+def select_auto_check_ids(db, scope: str, value: Optional[str]) -> List[str]:
+    """Assigned simcard ids for a job scope"""
+    cursor = db.cursor()
+    if scope == "shop":
+        cursor.execute("SELECT id FROM simcards WHERE status = 'assigned' AND assignedTo = ?", (value,))
+    elif scope == "region":
+        cursor.execute("""
+            SELECT id FROM simcards 
+            WHERE status = 'assigned' AND assignedTo IN (SELECT id FROM shops WHERE region = ?)
+        """, (value,))
+    else:
+        cursor.execute("SELECT id FROM simcards WHERE status = 'assigned'")
+    return [row["id"] for row in cursor.fetchall()]
+
+def find_covering_job(scope: str, value: Optional[str], force: bool = False) -> Optional[AutoCheckJob]:
+    """An active job, or one finished within the reuse window, that already covers the scope
+    
+    Forced jobs only join active forced jobs and never reuse finished ones.
+    """
+    now = time.monotonic()
+    for job in reversed(auto_check_jobs.values()):
+        if not job.covers(scope, value) or (force and not job.force):
+            continue
+        if job.active:
+            return job
+        if (not force and job.status == "completed" and job.finished_monotonic is not None
+                and now - job.finished_monotonic < AUTO_CHECK_JOB_REUSE_SECONDS):
+            return job
+    return None
+
+def forget_finished_jobs():
+    finished = [job_id for job_id, job in auto_check_jobs.items() if not job.active]
+    for job_id in finished[:max(0, len(finished) - AUTO_CHECK_JOBS_KEPT)]:
+        del auto_check_jobs[job_id]
+
+async def run_auto_check_job(job: AutoCheckJob):
+    job.status = "running"
+    job.started_at = datetime.now().isoformat()
+    engine = AutoCheckEngine(concurrency=job.concurrency)
+    try:
+        for start in range(0, len(job.simcard_ids), AUTO_CHECK_JOB_CHUNK_SIZE):
+            chunk = job.simcard_ids[start:start + AUTO_CHECK_JOB_CHUNK_SIZE]
+            run = await engine.run(chunk, job.force)
+            job.results.extend(run["results"])
+            job.newly_sold.extend(run["newlySold"])
+            job.external_calls += run["stats"]["externalCalls"]
+            job.checked += len(chunk)
+            for simcard_id in chunk:
+                claimed_simcards.pop(simcard_id, None)
+        job.finish("completed")
+        logger.info(f"Auto-check job {job.id} completed: {job.checked} cards, "
+                    f"{len(job.newly_sold)} newly sold")
+    except asyncio.CancelledError:
+        job.finish("cancelled")
+        raise
+    except Exception as e:
+        job.error = str(e)
+        job.finish("failed")
+        logger.error(f"Auto-check job {job.id} failed: {e}")
+    finally:
+        forget_finished_jobs()
+
+@app.post("/simcards/auto-check/jobs", status_code=202)
+async def create_auto_check_job(request: AutoCheckJobRequest):
+    """Start a background auto-check for all assigned cards, a shop or a region
+    
+    Returns immediately with a job id. A request already covered by an active
+    (or just finished) job returns that job instead of starting a new one, and
+    cards being checked by another active job are left to that job.
+    """
+    if request.scope not in ("all", "shop", "region"):
+        raise HTTPException(status_code=400, detail="scope must be one of: all, shop, region")
+    value = {"all": None, "shop": request.shopId, "region": request.region}[request.scope]
+    if request.scope != "all" and not value:
+        raise HTTPException(status_code=400, detail=f"{'shopId' if request.scope == 'shop' else 'region'} is required")
+    
+    existing = find_covering_job(request.scope, value, request.force)
+    if existing:
+        return {"jobId": existing.id, "status": existing.status, "total": len(existing.simcard_ids), "merged": True}
+    
+    concurrency = min(request.concurrency or AUTO_CHECK_CONCURRENCY, AUTO_CHECK_MAX_CONCURRENCY)
+    simcard_ids = await async_db.read(select_auto_check_ids, request.scope, value)
+    
+    # A covering job may have been started while the ids were loading
+    existing = find_covering_job(request.scope, value, request.force)
+    if existing:
+        return {"jobId": existing.id, "status": existing.status, "total": len(existing.simcard_ids), "merged": True}
+    unclaimed = [simcard_id for simcard_id in simcard_ids if simcard_id not in claimed_simcards]
+    
+    job = AutoCheckJob(request.scope, value, unclaimed, concurrency, request.force)
+    job.skipped = len(simcard_ids) - len(unclaimed)
+    job.merged_with = list(dict.fromkeys(claimed_simcards[i] for i in simcard_ids if i in claimed_simcards))
+    for simcard_id in unclaimed:
+        claimed_simcards[simcard_id] = job.id
+    auto_check_jobs[job.id] = job
+    job.task = asyncio.create_task(run_auto_check_job(job))
+    
+    logger.info(f"Auto-check job {job.id} queued: scope={request.scope}{' ' + value if value else ''}, "
+                f"{len(unclaimed)} cards ({job.skipped} already in progress)")
+    return {"jobId": job.id, "status": job.status, "total": len(unclaimed), "merged": False}
+
+@app.get("/simcards/auto-check/jobs")
+async def list_auto_check_jobs():
+    return [
+        {key: value for key, value in job.to_dict().items() if key not in ("results", "newlySold")}
+        for job in auto_check_jobs.values()
+    ]
+
+@app.get("/simcards/auto-check/jobs/{job_id}")
+async def get_auto_check_job(job_id: str, since: int = 0):
+    """Job progress; `results` holds only entries from index `since` on (pass back `nextIndex`)"""
+    job = auto_check_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict(since)
+
+@app.delete("/simcards/auto-check/jobs/{job_id}")
+async def cancel_auto_check_job(job_id: str):
+    job = auto_check_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.active and job.task:
+        job.task.cancel()
+        try:
+            await job.task
+        except asyncio.CancelledError:
+            pass
+        if job.active:
+            # Cancelled before it started running
+            job.finish("cancelled")
+    return {"jobId": job.id, "status": job.status}
+
+async def cancel_auto_check_jobs():
+    """Cancel running jobs (called at shutdown)"""
+    for job in list(auto_check_jobs.values()):
+        if job.active and job.task:
+            job.task.cancel()
+            try:
+                await job.task
+            except asyncio.CancelledError:
+                pass
+
+# Statistics endpoints
+def read_stat_counters(db, name: str) -> Dict[str, int]:
+    """Read one single-level counter group as {key: value}"""
+    cursor = db.cursor()
+    cursor.execute("SELECT key, value FROM stat_counters WHERE name = ? AND subkey = '' AND value != 0", (name,))
+    return {row["key"]: row["value"] for row in cursor.fetchall()}
+
+def read_statistics(db) -> Dict[str, Any]:
+    # Read incrementally maintained counters instead of scanning shops/simcards
+    shops_by_status = read_stat_counters(db, "shops_by_status")
+    simcards_by_status = read_stat_counters(db, "simcards_by_status")
+    region_stats = read_stat_counters(db, "shops_by_region")
     
     # Sales by date (last 7 days based on actual sold simcards)
+    cursor = db.cursor()
     cursor.execute("""
-        SELECT DATE(saleDate) as sale_date, COUNT(*) as count 
-        FROM simcards 
-        WHERE saleDate IS NOT NULL AND DATE(saleDate) >= DATE('now', '-7 days')
-        GROUP BY DATE(saleDate)
-        ORDER BY sale_date DESC
+        SELECT key as sale_date, value as count 
+        FROM stat_counters 
+        WHERE name = 'sales_by_day' AND key >= DATE('now', '-7 days')
     """)
     sales_data = cursor.fetchall()
     
@@ -720,30 +2786,33 @@ async def get_statistics(db = Depends(get_db)):
             sales_by_date[sale["sale_date"]] = sale["count"]
     
     return {
-        "totalShops": total_shops,
-        "activeShops": active_shops,
-        "totalSimCards": total_simcards,
-        "availableSimCards": available_simcards,
-        "assignedSimCards": assigned_simcards,
-        "soldSimCards": sold_simcards,
+        "totalShops": sum(shops_by_status.values()),
+        "activeShops": shops_by_status.get("active", 0),
+        "totalSimCards": sum(simcards_by_status.values()),
+        "availableSimCards": simcards_by_status.get("available", 0),
+        "assignedSimCards": simcards_by_status.get("assigned", 0),
+        "soldSimCards": simcards_by_status.get("sold", 0),
         "regionStats": region_stats,
         "salesByDate": sales_by_date
     }
 
-@app.get("/statistics/shops")
-async def get_shop_sales_stats(db = Depends(get_db)):
+@app.get("/statistics")
+async def get_statistics():
+    return await async_db.read(read_statistics)
+
+def read_shop_sales_stats(db) -> Dict[str, Dict[str, int]]:
     cursor = db.cursor()
     
+    # O(shops): one counter row per shop and status
     cursor.execute("""
         SELECT 
             s.id,
-            s.name,
-            COUNT(CASE WHEN sc.status = 'sold' THEN 1 END) as sold,
-            COUNT(CASE WHEN sc.status = 'assigned' THEN 1 END) as available,
-            COUNT(sc.id) as total
+            COALESCE(SUM(CASE WHEN c.subkey = 'sold' THEN c.value END), 0) as sold,
+            COALESCE(SUM(CASE WHEN c.subkey = 'assigned' THEN c.value END), 0) as available,
+            COALESCE(SUM(c.value), 0) as total
         FROM shops s
-        LEFT JOIN simcards sc ON s.id = sc.assignedTo
-        GROUP BY s.id, s.name
+        LEFT JOIN stat_counters c ON c.name = 'simcards_by_shop' AND c.key = s.id
+        GROUP BY s.id
     """)
     
     results = cursor.fetchall()
@@ -758,17 +2827,29 @@ async def get_shop_sales_stats(db = Depends(get_db)):
     
     return shop_stats
 
+@app.get("/statistics/shops")
+async def get_shop_sales_stats():
+    return await async_db.read(read_shop_sales_stats)
+
+@app.get("/admin/statistics/verify")
+async def verify_statistics():
+    """Compare statistics counters with the base tables"""
+    mismatches = await async_db.read(verify_stat_counters)
+    return {"consistent": not mismatches, "mismatches": mismatches}
+
+@app.post("/admin/statistics/rebuild")
+async def rebuild_statistics():
+    """Rebuild statistics counters from the base tables"""
+    return {"success": True, "counters": await async_db.write(rebuild_stat_counters)}
+
 @app.get("/logs/status-changes")
-async def get_status_change_logs(limit: int = 100, db = Depends(get_db)):
+async def get_status_change_logs(limit: int = 100):
     """Get recent status change logs"""
-    cursor = db.cursor()
-    cursor.execute("""
+    logs = await async_db.fetch_all("""
         SELECT * FROM status_check_logs 
         ORDER BY timestamp DESC 
         LIMIT ?
     """, (limit,))
-    
-    logs = cursor.fetchall()
     result = []
     for log in logs:
         log_dict = dict(log)
@@ -780,37 +2861,584 @@ async def get_status_change_logs(limit: int = 100, db = Depends(get_db)):
     
     return result
 
-# Background task to periodically check all simcards
-async def periodic_check_simcards():
-    """Background task to periodically check all assigned simcards"""
-    while True:
+# Delta sync
+def sync_changes(db, since: int, limit: int) -> Dict[str, Any]:
+    """Rows changed or deleted after version `since`, in version order
+    
+    Runs in one read transaction, so the returned version is consistent with
+    the rows. When the page is cut short by `limit`, `version` is the last
+    version included and `hasMore` is set; pass it back as `since`.
+    """
+    db.execute("BEGIN")
+    try:
+        current, floor = db.execute("SELECT version, tombstone_floor FROM sync_state WHERE id = 1").fetchone()
+        if since > 0 and since < floor:
+            # Tombstones needed by this client were pruned; it has to reload everything
+            return {"version": current, "reset": True, "hasMore": False, "simcards": [], "shops": [],
+                    "deleted": {"simcards": [], "shops": []}}
+        
+        changes = []
+        if limit > 0:
+            for entity, table, columns in (("simcards", "simcards", SIMCARD_COLUMNS), ("shops", "shops", SHOP_FIELDS)):
+                cursor = db.execute(f"""
+                    SELECT {', '.join(columns)} FROM {table} 
+                    WHERE changeVersion > ? ORDER BY changeVersion LIMIT ?
+                """, (since, limit + 1))
+                changes.extend((row["changeVersion"], entity, dict(row)) for row in cursor.fetchall())
+            if since > 0:
+                cursor = db.execute("""
+                    SELECT version, entity, entity_id FROM sync_tombstones 
+                    WHERE version > ? ORDER BY version LIMIT ?
+                """, (since, limit + 1))
+                changes.extend((row["version"], row["entity"], row["entity_id"]) for row in cursor.fetchall())
+        changes.sort(key=lambda change: change[0])
+    finally:
+        db.commit()
+    
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    result = {
+        "version": changes[-1][0] if has_more else current,
+        "reset": False,
+        "hasMore": has_more,
+        "simcards": [],
+        "shops": [],
+        "deleted": {"simcards": [], "shops": []}
+    }
+    for _, entity, payload in changes:
+        if entity == "simcard":
+            result["deleted"]["simcards"].append(payload)
+        elif entity == "shop":
+            result["deleted"]["shops"].append(payload)
+        else:
+            if entity == "shops":
+                payload["assignedSimCards"] = json.loads(payload["assignedSimCards"])
+            result[entity].append(payload)
+    return result
+
+@app.get("/sync")
+async def sync(since: int = 0, limit: int = SYNC_DEFAULT_LIMIT):
+    """Simcards and shops changed after `since`, plus ids deleted after it
+    
+    `since=0` returns every row; `limit=0` returns only the current version.
+    Check timestamps (lastChecked etc.) alone do not count as changes.
+    """
+    if since < 0 or limit < 0:
+        raise HTTPException(status_code=400, detail="since and limit must not be negative")
+    return await async_db.read(sync_changes, since, min(limit, LIST_MAX_LIMIT * 10))
+
+# Status change events (Server-Sent Events)
+def fetch_status_events(after_seq: int, limit: int = SSE_REPLAY_CHUNK) -> List[Dict[str, Any]]:
+    """Status change log rows after `after_seq`, as event payloads"""
+    with get_pool(DATABASE_NAME).connection() as db:
+        cursor = db.cursor()
+        cursor.execute("""
+            SELECT l.seq, l.id, l.simcard_id, l.simcard_code, l.old_status, l.new_status, l.source, l.timestamp,
+                   s.assignedTo, s.assignedShopName
+            FROM status_check_logs l 
+            LEFT JOIN simcards s ON s.id = l.simcard_id
+            WHERE l.seq > ?
+            ORDER BY l.seq
+            LIMIT ?
+        """, (after_seq, limit))
+        return [
+            {
+                "seq": row["seq"],
+                "id": row["id"],
+                "simCardId": row["simcard_id"],
+                "code": row["simcard_code"],
+                "oldStatus": row["old_status"],
+                "newStatus": row["new_status"],
+                "isSold": row["new_status"] == "sold",
+                "source": row["source"],
+                "timestamp": row["timestamp"],
+                "shopId": row["assignedTo"],
+                "shopName": row["assignedShopName"]
+            }
+            for row in cursor.fetchall()
+        ]
+
+def latest_status_event_seq() -> int:
+    with get_pool(DATABASE_NAME).connection() as db:
+        return db.execute("SELECT COALESCE(MAX(seq), 0) FROM status_check_logs").fetchone()[0]
+
+class StatusEventSubscriber:
+    """Bounded event queue of one SSE client; overflow switches it to DB replay"""
+    
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.lagged = False
+    
+    def offer(self, item: tuple) -> bool:
+        if self.lagged:
+            return False
         try:
-            logger.info("Starting periodic simcard check...")
-            
-            conn = sqlite3.connect(DATABASE_NAME)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            # Get all assigned simcards
-            cursor.execute("SELECT * FROM simcards WHERE status = 'assigned'")
-            simcards = cursor.fetchall()
-            
-            for simcard in simcards:
-                try:
-                    external_data = await check_external_simcard_status(simcard["code"])
-                    await update_simcard_from_external_data(conn, simcard["id"], simcard["code"], external_data)
-                    await asyncio.sleep(1)  # Rate limiting
-                except Exception as e:
-                    logger.error(f"Error checking simcard {simcard['code']}: {e}")
-            
-            conn.close()
-            logger.info(f"Periodic check completed for {len(simcards)} simcards")
+            self.queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            self.lagged = True
+            return False
+    
+    def drain(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.lagged = False
+
+class StatusEventBroadcaster:
+    """Fan-out of new status_check_logs rows to connected SSE clients
+    
+    A single task tails the log by `seq`: it wakes up when this process writes
+    a status change (notify) and every SSE_POLL_INTERVAL seconds for writes
+    from other processes. Slow clients never block it: when a client's queue
+    is full it is marked lagged and catches up from the log itself.
+    """
+    
+    def __init__(self, queue_size: int = SSE_QUEUE_SIZE, poll_interval: float = SSE_POLL_INTERVAL):
+        self.queue_size = queue_size
+        self.poll_interval = poll_interval
+        self.subscribers: set = set()
+        self.last_seq = 0
+        self.published = 0
+        self.overflows = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    def notify(self):
+        """Wake the tail loop after a status change was committed (thread-safe)"""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+    
+    def check_capacity(self):
+        if len(self.subscribers) >= SSE_MAX_SUBSCRIBERS:
+            raise HTTPException(status_code=503, detail="Too many event stream subscribers")
+    
+    def subscribe(self) -> StatusEventSubscriber:
+        self.check_capacity()
+        subscriber = StatusEventSubscriber(self.queue_size)
+        self.subscribers.add(subscriber)
+        return subscriber
+    
+    def unsubscribe(self, subscriber: StatusEventSubscriber):
+        self.subscribers.discard(subscriber)
+    
+    def publish(self, event_type: str, data: Dict[str, Any], seq: Optional[int] = None):
+        """Queue an event for every subscriber; events without seq are not replayable"""
+        self.published += 1
+        for subscriber in list(self.subscribers):
+            if not subscriber.offer((seq, event_type, data)):
+                self.overflows += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self.subscribers),
+            "lagged": sum(1 for subscriber in self.subscribers if subscriber.lagged),
+            "lastSeq": self.last_seq,
+            "published": self.published,
+            "overflows": self.overflows
+        }
+    
+    async def _run(self):
+        self.last_seq = await async_db.run(latest_status_event_seq)
+        while True:
+            notified = True
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                notified = False
+            self._wakeup.clear()
+            try:
+                if not self.subscribers:
+                    # Idle: follow this process's own writes but skip the timed poll;
+                    # rows another process wrote meanwhile are de-duplicated by seq
+                    if notified:
+                        self.last_seq = await async_db.run(latest_status_event_seq)
+                    continue
+                while True:
+                    events = await async_db.run(fetch_status_events, self.last_seq)
+                    for event in events:
+                        self.publish("status-change", event, seq=event["seq"])
+                        self.last_seq = event["seq"]
+                    if len(events) < SSE_REPLAY_CHUNK:
+                        break
+            except Exception as e:
+                logger.error(f"Error reading status change events: {e}")
+
+status_events = StatusEventBroadcaster()
+
+def format_sse(event_type: str, data: Dict[str, Any], seq: Optional[int] = None) -> str:
+    lines = [f"id: {seq}"] if seq is not None else []
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+async def iter_status_events(last_event_id: Optional[int]):
+    """Replay missed log rows after `last_event_id`, then stream live events
+    
+    Subscribes only once the response is being streamed, so a request whose
+    body is never iterated cannot hold a subscriber slot.
+    """
+    subscriber = status_events.subscribe()
+    try:
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        if last_event_id is None:
+            sent = await async_db.run(latest_status_event_seq)
+            replay = False
+        else:
+            sent = last_event_id
+            replay = True
+        
+        while True:
+            if replay or subscriber.lagged:
+                # Catch up from the log; events queued meanwhile are de-duplicated by seq
+                subscriber.drain()
+                while True:
+                    events = await async_db.run(fetch_status_events, sent)
+                    for event in events:
+                        yield format_sse("status-change", event, event["seq"])
+                        sent = event["seq"]
+                    if len(events) < SSE_REPLAY_CHUNK:
+                        break
+                replay = False
             
-        except Exception as e:
-            logger.error(f"Error in periodic check: {e}")
+            try:
+                seq, event_type, data = await asyncio.wait_for(subscriber.queue.get(), SSE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if seq is not None:
+                if seq <= sent:
+                    continue
+                sent = seq
+            yield format_sse(event_type, data, seq)
+    finally:
+        status_events.unsubscribe(subscriber)
+
+@app.get("/events/status-changes")
+async def stream_status_changes(request: Request, lastEventId: Optional[str] = None):
+    """Server-Sent Events stream of simcard status changes and auto-check job completions
+    
+    Event ids are status_check_logs.seq values; reconnecting with the
+    Last-Event-ID header (or `lastEventId`) replays everything missed.
+    """
+    raw_last_event_id = request.headers.get("last-event-id") or lastEventId
+    last_event_id = None
+    if raw_last_event_id:
+        try:
+            last_event_id = int(raw_last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+    
+    status_events.check_capacity()
+    return StreamingResponse(
+        iter_status_events(last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Streaming export endpoints
+STATUS_LOG_FIELDS = ("id", "simcard_id", "simcard_code", "old_status", "new_status", "source", "timestamp", "details")
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson"
+}
+
+def iter_export_rows(sql: str, params: List[Any], columns: List[str], export_format: str):
+    """Yield encoded CSV/NDJSON chunks while reading the cursor in chunks
+    
+    Uses its own connection so a long export does not hold a pooled one.
+    """
+    conn = connect(DATABASE_NAME)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            yield buffer.getvalue().encode("utf-8")
+        
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+            if not rows:
+                break
+            if export_format == "csv":
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows(tuple(row) for row in rows)
+                yield buffer.getvalue().encode("utf-8")
+            else:
+                yield "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in rows).encode("utf-8")
+    finally:
+        conn.close()
+
+def export_response(name: str, sql: str, params: List[Any], columns: List[str], export_format: str):
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {export_format} (use csv or ndjson)")
+    filename = f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    return StreamingResponse(
+        iter_export_rows(sql, params, columns, export_format),
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/export/simcards")
+async def export_simcards(format: str = "csv", status: Optional[str] = None, shopId: Optional[str] = None,
+                          fields: Optional[str] = None):
+    """Stream all simcards as CSV or NDJSON"""
+    columns = parse_fields(fields, SIMCARD_COLUMNS)
+    where, params = [], []
+    if status:
+        where.append("status = ?")
+        params.append(status)
+    if shopId:
+        where.append("assignedTo = ?")
+        params.append(shopId)
+    sql = f"SELECT {', '.join(columns)} FROM simcards"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY addedDate DESC, id DESC"
+    return export_response("simcards", sql, params, columns, format)
+
+@app.get("/export/shops")
+async def export_shops(format: str = "csv", fields: Optional[str] = None):
+    """Stream all shops as CSV or NDJSON"""
+    columns = parse_fields(fields, SHOP_FIELDS)
+    sql = f"SELECT {', '.join(columns)} FROM shops ORDER BY addedDate DESC, id DESC"
+    return export_response("shops", sql, [], columns, format)
+
+@app.get("/export/status-logs")
+async def export_status_logs(format: str = "csv", since: Optional[str] = None):
+    """Stream status change logs as CSV or NDJSON"""
+    columns = list(STATUS_LOG_FIELDS)
+    sql = f"SELECT {', '.join(columns)} FROM status_check_logs"
+    params = []
+    if since:
+        sql += " WHERE timestamp >= ?"
+        params.append(since)
+    sql += " ORDER BY timestamp DESC"
+    return export_response("status-logs", sql, params, columns, format)
+
+# Background check scheduler
+class TokenBucket:
+    """Async token bucket allowing `rate` tokens per second with bursts up to `capacity`
+    
+    Requests larger than the capacity are allowed once the bucket is full and
+    leave it in debt, so the long-run rate still holds.
+    """
+    
+    def __init__(self, rate: float, capacity: Optional[int] = None):
+        self.rate = max(rate, 0.001)
+        self.capacity = max(1, capacity or int(rate) or 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    async def acquire(self, tokens: int = 1):
+        async with self._lock:
+            needed = min(tokens, self.capacity)
+            while True:
+                self._refill()
+                if self._tokens >= needed:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((needed - self._tokens) / self.rate)
+
+class SweepScheduler:
+    """Rate-limited background sweep over assigned simcards
+    
+    Each sweep checks assigned cards stalest-first (by lastExternalCheck), read
+    from the DB in chunks. The sweep start time and progress are persisted in
+    `sweep_state`, so after a restart the sweep resumes with the cards not yet
+    checked since it started instead of starting over.
+    """
+    
+    STATE_NAME = "auto_check"
+    
+    def __init__(self, interval: float = SWEEP_INTERVAL, rate: float = SWEEP_RATE, burst: int = SWEEP_BURST,
+                 concurrency: int = SWEEP_CONCURRENCY, chunk_size: int = SWEEP_CHUNK_SIZE,
+                 batch_size: int = SWEEP_BATCH_SIZE):
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.rate_limiter = TokenBucket(rate, burst)
+        self.engine = AutoCheckEngine(concurrency=concurrency, external_batch_size=batch_size,
+                                      rate_limiter=self.rate_limiter)
+        self._task: Optional[asyncio.Task] = None
+        self._current_sweep: Optional[str] = None
+        self.last_error: Optional[str] = None
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Sweep scheduler started (rate={self.rate_limiter.rate}/s, "
+                        f"concurrency={self.engine.concurrency}, interval={self.interval:.0f}s)")
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("Sweep scheduler stopped")
+    
+    def load_state(self, db) -> Dict[str, Any]:
+        cursor = db.cursor()
+        cursor.execute("SELECT * FROM sweep_state WHERE name = ?", (self.STATE_NAME,))
+        row = cursor.fetchone()
+        if row:
+            return dict(row)
+        return {
+            "name": self.STATE_NAME,
+            "sweep_started_at": None,
+            "checked": 0,
+            "last_completed_at": None,
+            "last_duration_ms": None,
+            "last_checked": None
+        }
+    
+    def save_state(self, db, state: Dict[str, Any]):
+        db.execute("""
+            INSERT INTO sweep_state 
+            (name, sweep_started_at, checked, last_completed_at, last_duration_ms, last_checked)
+            VALUES (:name, :sweep_started_at, :checked, :last_completed_at, :last_duration_ms, :last_checked)
+            ON CONFLICT (name) DO UPDATE SET
+                sweep_started_at = excluded.sweep_started_at,
+                checked = excluded.checked,
+                last_completed_at = excluded.last_completed_at,
+                last_duration_ms = excluded.last_duration_ms,
+                last_checked = excluded.last_checked
+        """, state)
+        db.commit()
+    
+    def backlog(self, db, sweep_started_at: Optional[str]) -> int:
+        """Assigned cards not yet checked in the current sweep"""
+        cursor = db.cursor()
+        if sweep_started_at is None:
+            cursor.execute("SELECT COUNT(*) FROM simcards WHERE status = 'assigned'")
+        else:
+            cursor.execute("""
+                SELECT COUNT(*) FROM simcards 
+                WHERE status = 'assigned' AND (lastExternalCheck IS NULL OR lastExternalCheck < ?)
+            """, (sweep_started_at,))
+        return cursor.fetchone()[0]
+    
+    def next_chunk(self, db, sweep_started_at: str) -> List[str]:
+        cursor = db.cursor()
+        cursor.execute("""
+            SELECT id FROM simcards 
+            WHERE status = 'assigned' AND (lastExternalCheck IS NULL OR lastExternalCheck < ?)
+            ORDER BY lastExternalCheck
+            LIMIT ?
+        """, (sweep_started_at, self.chunk_size))
+        return [row["id"] for row in cursor.fetchall()]
+    
+    def status(self) -> Dict[str, Any]:
+        with get_pool(DATABASE_NAME).connection() as db:
+            state = self.load_state(db)
+            backlog = self.backlog(db, state["sweep_started_at"])
+        return {
+            "enabled": SWEEP_ENABLED,
+            "running": self.running,
+            "rate": self.rate_limiter.rate,
+            "concurrency": self.engine.concurrency,
+            "intervalSeconds": self.interval,
+            "sweepStartedAt": state["sweep_started_at"],
+            "checkedThisSweep": state["checked"],
+            "backlog": backlog,
+            "lastCompletedAt": state["last_completed_at"],
+            "lastDurationMs": state["last_duration_ms"],
+            "lastSweepChecked": state["last_checked"],
+            "lastError": self.last_error
+        }
+    
+    async def _run(self):
+        while True:
+            try:
+                delay = await self.step()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Error in background sweep: {e}")
+                delay = 30.0
+            if delay:
+                await asyncio.sleep(delay)
+    
+    async def step(self) -> float:
+        """Run one chunk of the current sweep, returns seconds to wait before the next step"""
+        if not external_breaker.allow_probe_soon():
+            # Upstream is down: wait for the breaker instead of marking every card as errored
+            return max(1.0, external_breaker.stats()["probeInSeconds"] or 0.0)
+        state = await async_db.read(self.load_state)
         
-        # Wait 30 minutes before next check
-        await asyncio.sleep(30 * 60)
+        if state["sweep_started_at"] is None:
+            if state["last_completed_at"]:
+                elapsed = (datetime.now() - datetime.fromisoformat(state["last_completed_at"])).total_seconds()
+                if elapsed < self.interval:
+                    return self.interval - elapsed
+            state.update(sweep_started_at=datetime.now().isoformat(), checked=0)
+            await async_db.write(self.save_state, state)
+            backlog = await async_db.read(self.backlog, state["sweep_started_at"])
+            logger.info(f"Starting background sweep ({backlog} cards)")
+        elif self._current_sweep != state["sweep_started_at"]:
+            logger.info(f"Resuming background sweep started at {state['sweep_started_at']} "
+                        f"({state['checked']} cards already checked)")
+        self._current_sweep = state["sweep_started_at"]
+        
+        simcard_ids = await async_db.read(self.next_chunk, state["sweep_started_at"])
+        if not simcard_ids:
+            started = datetime.fromisoformat(state["sweep_started_at"])
+            state.update(
+                sweep_started_at=None,
+                last_completed_at=datetime.now().isoformat(),
+                last_duration_ms=round((datetime.now() - started).total_seconds() * 1000, 2),
+                last_checked=state["checked"]
+            )
+            await async_db.write(self.save_state, state)
+            logger.info(f"Background sweep completed: {state['last_checked']} cards "
+                        f"in {state['last_duration_ms'] / 1000:.1f}s")
+            return 0.0
+        
+        # Always fresh results, so a sweep never reports statuses older than the cache TTL
+        run = await self.engine.run(simcard_ids, force=True)
+        state["checked"] += run["stats"]["checked"]
+        await async_db.write(self.save_state, state)
+        self.last_error = None
+        return 0.0
+
+sweep_scheduler = SweepScheduler()
+
+@app.get("/admin/scheduler")
+async def get_scheduler_status():
+    """Background sweep progress, backlog and last sweep duration"""
+    return await async_db.run(sweep_scheduler.status)
 
 # Health check
 @app.get("/")
@@ -832,25 +3460,30 @@ async def health_check():
     """Health check endpoint"""
     try:
         # Test database connection
-        conn = sqlite3.connect(DATABASE_NAME)
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM simcards")
-        simcard_count = cursor.fetchone()[0]
-        conn.close()
+        simcard_count = (await async_db.fetch_one("SELECT COUNT(*) FROM simcards"))[0]
         
-        # Test external API connection
+        # Test external API connection (through the shared pooled client)
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(f"{EXTERNAL_API_BASE_URL}/")
-                external_api_status = "ok" if response.status_code == 200 else "error"
+            response = await get_external_client().get("/", timeout=5.0)
+            external_api_status = "ok" if response.status_code == 200 else "error"
         except:
             external_api_status = "unreachable"
         
         return {
             "status": "healthy",
             "database": "connected",
+            "database_pool": get_pool(DATABASE_NAME).stats(),
+            "database_executor": async_db.stats(),
+            "status_writer": status_writer.stats(),
             "simcard_count": simcard_count,
             "external_api": external_api_status,
+            "external_pool": external_pool_stats(),
+            "external_breaker": {**external_breaker.stats(), **external_call_stats},
+            "status_cache": status_result_cache.stats(),
+            "external_singleflight": external_singleflight.stats(),
+            "response_cache": response_cache.stats(),
+            "status_events": status_events.stats(),
+            "query_tracer": query_tracer.stats(),
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
@@ -860,17 +3493,126 @@ async def health_check():
             "timestamp": datetime.now().isoformat()
         }
 
+# Metrics
+def _inventory_metrics() -> Dict[tuple, float]:
+    with get_pool(DATABASE_NAME).connection() as db:
+        rows = db.execute("""
+            SELECT name, key, value FROM stat_counters 
+            WHERE name IN ('simcards_by_status', 'shops_by_status') AND subkey = ''
+        """).fetchall()
+    return {("simcards" if row["name"] == "simcards_by_status" else "shops", row["key"]): row["value"] for row in rows}
+
+def _sweep_metrics() -> Dict[tuple, float]:
+    status = sweep_scheduler.status()
+    return {
+        ("running",): 1 if status["running"] else 0,
+        ("checked_this_sweep",): status["checkedThisSweep"],
+        ("backlog",): status["backlog"],
+        ("last_duration_seconds",): status["lastDurationMs"] / 1000 if status["lastDurationMs"] is not None else None,
+        ("last_sweep_checked",): status["lastSweepChecked"]
+    }
+
+def _runtime_metrics() -> Dict[tuple, float]:
+    breaker_states = {"closed": 0, "half_open": 1, "open": 2}
+    values = {
+        ("external_requests_in_flight",): external_requests_in_flight,
+        ("external_breaker_state",): breaker_states[external_breaker.state],
+        ("external_breaker_trips",): external_breaker.trips,
+        ("external_retries",): external_call_stats["retries"],
+        ("external_hedges",): external_call_stats["hedges"],
+        ("sse_subscribers",): len(status_events.subscribers),
+        ("sse_overflows",): status_events.overflows,
+        ("auto_check_jobs_active",): sum(1 for job in auto_check_jobs.values() if job.active),
+    }
+    for prefix, stats in (("status_cache", status_result_cache.stats()),
+                          ("singleflight", external_singleflight.stats()),
+                          ("response_cache", response_cache.stats()),
+                          ("status_writer", status_writer.stats())):
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                values[(f"{prefix}_{key}",)] = value
+    return values
+
+REGISTRY.gauge("simcard_inventory", "Simcards and shops by status (from stat_counters)",
+               _inventory_metrics, ("entity", "status"))
+REGISTRY.gauge("sweep_progress", "Background sweep progress", _sweep_metrics, ("field",))
+REGISTRY.gauge("simcard_api_runtime", "In-process caches, breaker and background work "
+               "(breaker state: 0 closed, 1 half-open, 2 open)", _runtime_metrics, ("field",))
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text-format metrics"""
+    body = await async_db.run(REGISTRY.render)
+    return Response(content=body, media_type=METRICS_CONTENT_TYPE)
+
+app.add_middleware(MetricsMiddleware)
+
+# CORS middleware (added last so it wraps the other middleware, e.g. cached responses)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
 # Start background task
 @app.on_event("startup")
 async def startup_event():
     """Run startup tasks"""
     logger.info("Starting SimCard Management API...")
     init_database()
+    get_external_client()
     
-    # Start background periodic check (optional - can be enabled/disabled)
-    # asyncio.create_task(periodic_check_simcards())
+    status_events.start()
+    
+    # Start background sweep scheduler (enabled with SWEEP_ENABLED=1)
+    if SWEEP_ENABLED:
+        sweep_scheduler.start()
 
-if __name__ == "__main__":
-    logger.info("Initializing database and starting server on port 9022...")
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Run shutdown tasks"""
+    await sweep_scheduler.stop()
+    await cancel_auto_check_jobs()
+    await status_writer.stop()
+    remove_conflict_files()
+    await status_events.stop()
+    await close_external_client()
+    data_version.close()
+    
+    # Let SQLite refresh planner statistics for the new indexes when worthwhile
+    await async_db.execute("PRAGMA optimize")
+    async_db.close()
+    close_pools()
+    logger.info("SimCard Management API stopped")
+
+def run_statistics_command(command: str) -> int:
+    """`--check-stats` / `--rebuild-stats` maintenance commands, returns exit code"""
     init_database()
+    with get_pool(DATABASE_NAME).connection() as conn:
+        if command == "rebuild":
+            print(f"Statistics counters rebuilt ({rebuild_stat_counters(conn)} rows)")
+            return 0
+        mismatches = verify_stat_counters(conn)
+    for mismatch in mismatches:
+        print(f"{mismatch['name']} {mismatch['key']} {mismatch['subkey']}: "
+              f"stored={mismatch['stored']} expected={mismatch['expected']}")
+    print("Statistics counters are consistent" if not mismatches else f"{len(mismatches)} counters differ")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    
+    parser = argparse.ArgumentParser(description="SimCard Management API Server")
+    parser.add_argument("--check-stats", action="store_true", help="verify statistics counters and exit")
+    parser.add_argument("--rebuild-stats", action="store_true", help="rebuild statistics counters and exit")
+    args = parser.parse_args()
+    
+    if args.check_stats or args.rebuild_stats:
+        sys.exit(run_statistics_command("rebuild" if args.rebuild_stats else "check"))
+    
+    # Database is initialized (migrated) once, by startup_event
+    logger.info("Starting server on port 9022...")
     uvicorn.run(app, host="0.0.0.0", port=9022)
\ No newline at end of file
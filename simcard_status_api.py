@@ -4,17 +4,27 @@ SimCard Status Check API Server
 Port: 9020 (only for simcard status checking)
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Dict, Any
-import sqlite3
+from typing import Dict, Any, List, Optional
 import uvicorn
 from datetime import datetime
+import asyncio
 import json
+import logging
+import os
+
+from database import DATABASE_NAME, AsyncDatabase, close_pools
+from metrics import REGISTRY, MetricsMiddleware, CONTENT_TYPE as METRICS_CONTENT_TYPE
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="SimCard Status API", version="1.0.0")
 
+# Request metrics (per route template), exposed at /metrics
+app.add_middleware(MetricsMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -24,21 +34,146 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Database name (should be same as main API)
-DATABASE_NAME = "simcard_db.sqlite"
+# Database (same file as main API, env SIMCARD_DB); lookups run off the event loop through database.py
+async_db = AsyncDatabase(DATABASE_NAME)
+
+# Batch lookup limits
+BULK_CHECK_MAX_CODES = 5000
+BULK_CHECK_CHUNK_SIZE = 500  # stays below SQLite's bound-parameter limit
+
+# Buffered lastChecked writes
+LAST_CHECKED_FLUSH_INTERVAL = float(os.getenv("LAST_CHECKED_FLUSH_INTERVAL", "5.0"))  # seconds between flushes
+LAST_CHECKED_MAX_BUFFERED = int(os.getenv("LAST_CHECKED_MAX_BUFFERED", "100000"))  # codes that trigger an early flush
+
+status_lookups = REGISTRY.counter(
+    "status_lookups_total", "Simcard codes looked up by endpoint and result", ("endpoint", "result")
+)
 
-def get_db():
-    """Get database connection"""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-    finally:
-        conn.close()
+def write_last_checked(db, touches: Dict[str, str]) -> int:
+    """Store buffered lastChecked times; a newer time already in the row is kept"""
+    cursor = db.cursor()
+    cursor.executemany(
+        "UPDATE simcards SET lastChecked = ? WHERE code = ? AND (lastChecked IS NULL OR lastChecked < ?)",
+        [(checked_at, code, checked_at) for code, checked_at in touches.items()]
+    )
+    return cursor.rowcount
+
+class LastCheckedBuffer:
+    """Write-behind buffer for lastChecked touches of looked-up simcards
+    
+    Lookups only record the code and time in memory (the latest time per
+    code wins); a background task writes them in one transaction every
+    `interval` seconds, or sooner once `max_buffered` codes are waiting,
+    and a final flush runs at shutdown.
+    """
+    
+    def __init__(self, interval: float = LAST_CHECKED_FLUSH_INTERVAL, max_buffered: int = LAST_CHECKED_MAX_BUFFERED):
+        self.interval = max(0.01, interval)
+        self.max_buffered = max(1, max_buffered)
+        self._touches: Dict[str, str] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self.flushes = 0
+        self.written = 0
+        self.failures = 0
+    
+    def touch(self, codes: List[str], checked_at: Optional[str] = None):
+        checked_at = checked_at or datetime.now().isoformat()
+        for code in codes:
+            self._touches[code] = checked_at
+        self.start()
+        if len(self._touches) >= self.max_buffered:
+            self._wakeup.set()
+    
+    def start(self):
+        """Start the flush task unless it is running"""
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+    
+    async def flush(self) -> int:
+        """Write the buffered touches now, returns the number of codes"""
+        if not self._touches:
+            return 0
+        touches, self._touches = self._touches, {}
+        try:
+            await async_db.write(write_last_checked, touches)
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"Writing lastChecked for {len(touches)} simcards failed: {e}")
+            self._restore(touches)
+            return 0
+        except BaseException:
+            # Cancelled while waiting: rewriting the same times later is harmless
+            self._restore(touches)
+            raise
+        self.flushes += 1
+        self.written += len(touches)
+        return len(touches)
+    
+    def _restore(self, touches: Dict[str, str]):
+        # Keep them for the next flush unless a newer touch came in meanwhile
+        for code, checked_at in touches.items():
+            self._touches.setdefault(code, checked_at)
+    
+    async def stop(self):
+        """Stop the background task and write what is left"""
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            try:
+                await self._task
+            finally:
+                self._task = None
+        await self.flush()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self._touches),
+            "flushes": self.flushes,
+            "written": self.written,
+            "failures": self.failures
+        }
+
+last_checked_buffer = LastCheckedBuffer()
+
+def _last_checked_metrics() -> Dict[tuple, float]:
+    return {(key,): value for key, value in last_checked_buffer.stats().items()}
+
+REGISTRY.gauge("last_checked_buffer", "Buffered lastChecked writes of the status API", _last_checked_metrics, ("field",))
+
+def find_simcard(db, code: str):
+    return db.execute("SELECT code, status, saleDate FROM simcards WHERE code = ?", (code,)).fetchone()
+
+def find_simcards(db, codes: List[str]) -> Dict[str, Any]:
+    """Look up many codes with one query per chunk, keyed by code"""
+    cursor = db.cursor()
+    found = {}
+    for start in range(0, len(codes), BULK_CHECK_CHUNK_SIZE):
+        chunk = codes[start:start + BULK_CHECK_CHUNK_SIZE]
+        placeholders = ", ".join("?" for _ in chunk)
+        cursor.execute(f"SELECT code, status, saleDate FROM simcards WHERE code IN ({placeholders})", chunk)
+        for simcard in cursor.fetchall():
+            found[simcard["code"]] = simcard
+    return found
 
 class CheckStatusRequest(BaseModel):
     code: str
 
+class BulkCheckStatusRequest(BaseModel):
+    codes: List[str]
+
 # SimCard status check endpoints
 @app.post("/check-simcard-status")
 async def check_simcard_status(request: CheckStatusRequest):
@@ -47,71 +182,107 @@ async def check_simcard_status(request: CheckStatusRequest):
     if not code:
         raise HTTPException(status_code=400, detail="SimCard code is required")
     
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    simcard = await async_db.read(find_simcard, code)
     
-    try:
-        cursor.execute("SELECT * FROM simcards WHERE code = ?", (code,))
-        simcard = cursor.fetchone()
-        
-        if not simcard:
-            return {
-                "status": "not_found",
-                "is_sold": False,
-                "sale_date": None,
-                "message": "Simkarta topilmadi"
-            }
-        
-        # Update lastChecked
-        cursor.execute("UPDATE simcards SET lastChecked = ? WHERE code = ?", 
-                       (datetime.now().isoformat(), code))
-        conn.commit()
-        
+    if not simcard:
+        status_lookups.inc("single", "not_found")
         return {
-            "status": simcard["status"],
-            "is_sold": simcard["status"] == "sold",
-            "sale_date": simcard["saleDate"],
-            "message": f"Simkarta holati: {simcard['status']}"
+            "status": "not_found",
+            "is_sold": False,
+            "sale_date": None,
+            "message": "Simkarta topilmadi"
         }
-    finally:
-        conn.close()
+    status_lookups.inc("single", "found")
+    
+    # lastChecked is written later by the buffer
+    last_checked_buffer.touch([code])
+    
+    return {
+        "status": simcard["status"],
+        "is_sold": simcard["status"] == "sold",
+        "sale_date": simcard["saleDate"],
+        "message": f"Simkarta holati: {simcard['status']}"
+    }
 
 @app.get("/bulk-check-simcards/{code}")
 async def bulk_check_simcard_status(code: str):
     """Bulk check endpoint for individual simcard by code"""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute("SELECT * FROM simcards WHERE code = ?", (code,))
-        simcard = cursor.fetchone()
-        
+    simcard = await async_db.read(find_simcard, code)
+    
+    if not simcard:
+        status_lookups.inc("single", "not_found")
+        return {
+            "status": "not_found",
+            "is_sold": False,
+            "sale_date": None
+        }
+    status_lookups.inc("single", "found")
+    
+    last_checked_buffer.touch([code])
+    
+    return {
+        "status": simcard["status"],
+        "is_sold": simcard["status"] == "sold",
+        "sale_date": simcard["saleDate"]
+    }
+
+@app.post("/bulk-check-simcards")
+async def bulk_check_simcard_statuses(request: BulkCheckStatusRequest):
+    """Batch check: resolve many simcard codes with set-based queries"""
+    codes = list(dict.fromkeys(code for code in request.codes if code))
+    if len(codes) > BULK_CHECK_MAX_CODES:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_CHECK_MAX_CODES} codes per request")
+    
+    found = await async_db.read(find_simcards, codes)
+    last_checked_buffer.touch(list(found))
+    status_lookups.inc("bulk", "found", amount=len(found))
+    status_lookups.inc("bulk", "not_found", amount=len(codes) - len(found))
+    
+    results = {}
+    for code in codes:
+        simcard = found.get(code)
         if not simcard:
-            return {
+            results[code] = {
                 "status": "not_found",
                 "is_sold": False,
-                "sale_date": None
+                "sale_date": None,
+                "message": "Simkarta topilmadi"
             }
-        
-        # Update lastChecked
-        cursor.execute("UPDATE simcards SET lastChecked = ? WHERE code = ?", 
-                       (datetime.now().isoformat(), code))
-        conn.commit()
-        
-        return {
-            "status": simcard["status"],
-            "is_sold": simcard["status"] == "sold",
-            "sale_date": simcard["saleDate"]
-        }
-    finally:
-        conn.close()
+        else:
+            results[code] = {
+                "status": simcard["status"],
+                "is_sold": simcard["status"] == "sold",
+                "sale_date": simcard["saleDate"],
+                "message": f"Simkarta holati: {simcard['status']}"
+            }
+    
+    return {
+        "results": results,
+        "count": len(results),
+        "found": len(found)
+    }
 
 @app.get("/")
 async def root():
     return {"message": "SimCard Status API is running on port 9020", "version": "1.0.0"}
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text-format metrics"""
+    return Response(content=REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.on_event("startup")
+async def startup_event():
+    """Start the lastChecked flush task"""
+    last_checked_buffer.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Write buffered lastChecked times and close database connections"""
+    await last_checked_buffer.stop()
+    async_db.close()
+    close_pools()
+
 if __name__ == "__main__":
     print("Starting SimCard Status API on port 9020...")
     uvicorn.run(app, host="0.0.0.0", port=9020)
\ No newline at end of file
@@ -1,6 +1,6 @@
-import React, { createContext, useContext, useState, useEffect, ReactNode } from 'react';
+import React, { createContext, useContext, useState, useEffect, useRef, ReactNode } from 'react';
 import { useToast } from '@/hooks/use-toast';
-import { apiClient, SimCard } from '@/services/api';
+import { apiClient, SimCard, StatusChangeEvent, AutoCheckJobEvent } from '@/services/api';
 
 interface SimCardContextType {
   simCards: SimCard[];
@@ -8,6 +8,7 @@ interface SimCardContextType {
   error: string | null;
   setSimCards: React.Dispatch<React.SetStateAction<SimCard[]>>;
   fetchSimCards: () => Promise<void>;
+  syncSimCards: () => Promise<void>;
   createSimCard: (simCardData: Omit<SimCard, 'id'>) => Promise<boolean>;
   updateSimCard: (simCardId: string, simCardData: Partial<SimCard>) => Promise<boolean>;
   deleteSimCard: (simCardId: string) => Promise<boolean>;
@@ -27,11 +28,16 @@ export const SimCardProvider: React.FC<{ children: ReactNode }> = ({ children })
   const [lastAutoCheck, setLastAutoCheck] = useState<string | null>(null);
   const [autoCheckStatus, setAutoCheckStatus] = useState<'idle' | 'checking' | 'error'>('idle');
 
+  // Versiya ro'yxatdan oldin olinadi: oraliqdagi o'zgarishlar keyingi sinxronlashda qayta keladi
+  const syncVersion = useRef<number | null>(null);
+
   const fetchSimCards = async () => {
     setIsLoading(true);
     setError(null);
     try {
+      const { version } = await apiClient.syncChanges(0, 0);
       const data = await apiClient.getSimCards();
+      syncVersion.current = version;
       setSimCards(data);
     } catch (error) {
       const errorMessage = 'Simkartalarni yuklashda xatolik yuz berdi';
@@ -46,6 +52,37 @@ export const SimCardProvider: React.FC<{ children: ReactNode }> = ({ children })
     }
   };
 
+  // Faqat o'zgargan/o'chirilgan simkartalarni olish (butun ro'yxatni qayta yuklamasdan)
+  const syncSimCards = async () => {
+    if (syncVersion.current === null) return;
+    try {
+      let hasMore = true;
+      while (hasMore) {
+        const changes = await apiClient.syncChanges(syncVersion.current);
+        if (changes.reset) {
+          await fetchSimCards();
+          return;
+        }
+        const changed = new Map(changes.simcards.map(card => [card.id, card]));
+        const deleted = new Set(changes.deleted.simcards);
+        if (changed.size > 0 || deleted.size > 0) {
+          setSimCards(prev => {
+            const known = new Set(prev.map(card => card.id));
+            const added = changes.simcards.filter(card => !known.has(card.id));
+            const next = prev
+              .filter(card => !deleted.has(card.id))
+              .map(card => changed.has(card.id) ? { ...card, ...changed.get(card.id) } : card);
+            return [...added, ...next];
+          });
+        }
+        syncVersion.current = changes.version;
+        hasMore = changes.hasMore;
+      }
+    } catch (error) {
+      console.error('Sinxronlashda xatolik:', error);
+    }
+  };
+
   const createSimCard = async (simCardData: Omit<SimCard, 'id'>): Promise<boolean> => {
     try {
       const newSimCard = await apiClient.createSimCard(simCardData);
@@ -149,46 +186,96 @@ export const SimCardProvider: React.FC<{ children: ReactNode }> = ({ children })
     fetchSimCards();
   }, []);
 
-  // Avtomatik tekshirish intervali (5 daqiqa) - faqat birinchi yuklanganda ishga tushadi
+  // Oynaga qaytilganda faqat o'zgarishlarni olish (masalan, magazin o'chirilgandan keyin bo'shagan simkartalar)
   useEffect(() => {
-    const checkSimCards = async () => {
-      if (simCards.length === 0) return; // Agar simkartalar bo'lmasa tekshirmaymiz
-      
-      setAutoCheckStatus('checking');
-      
-      try {
-        const response = await apiClient.autoCheckSimCards(simCards);
-        
-        // Simkartalar holatini yangilash
-        const updatedSimCards = simCards.map(simCard => {
-          const result = response.results.find((r: any) => r.simCardId === simCard.id);
-          if (result) {
-            return {
-              ...simCard,
-              status: result.status,
-              saleDate: result.saleDate,
-              lastChecked: result.lastChecked
-            };
-          }
-          return simCard;
-        });
+    const onFocus = () => { syncSimCards(); };
+    window.addEventListener('focus', onFocus);
+    return () => window.removeEventListener('focus', onFocus);
+  }, []);
 
-        setSimCards(updatedSimCards);
-        setLastAutoCheck(response.timestamp);
-        setAutoCheckStatus('idle');
+  const autoCheckJobId = useRef<string | null>(null);
+  // Job id hali ma'lum bo'lmaganda kelgan tugash hodisalari (start so'rovi javobidan oldin)
+  const finishedAutoCheckJobs = useRef(new Map<string, AutoCheckJobEvent>());
 
-        // Yangi sotilgan simkartalar haqida xabar berish
-        const newlySold = response.results.filter((r: any) => 
-          r.isSold && simCards.find(s => s.id === r.simCardId)?.status !== 'sold'
-        );
+  const applyAutoCheckJobEvent = (event: AutoCheckJobEvent) => {
+    setLastAutoCheck(event.finishedAt);
+    setAutoCheckStatus(event.status === 'completed' ? 'idle' : 'error');
+  };
 
-        if (newlySold.length > 0) {
-          toast({
-            title: "Yangi sotuvlar!",
-            description: `${newlySold.length} ta simkarta sotildi`,
-          });
+  // Status o'zgarishlari serverdan SSE orqali keladi (polling yo'q).
+  // Uzilishda EventSource o'zi qayta ulanadi va Last-Event-ID bilan o'tkazib yuborilganlarini oladi.
+  useEffect(() => {
+    const events = apiClient.openStatusEvents();
+    let soldCount = 0;
+    let soldToastTimer: NodeJS.Timeout | null = null;
+
+    events.addEventListener('status-change', (message: MessageEvent) => {
+      const event: StatusChangeEvent = JSON.parse(message.data);
+      setSimCards(prev => prev.map(simCard => simCard.id === event.simCardId
+        ? {
+            ...simCard,
+            status: event.newStatus,
+            saleDate: event.isSold ? (simCard.saleDate || event.timestamp) : simCard.saleDate,
+            lastChecked: event.timestamp
+          }
+        : simCard
+      ));
+
+      // Yangi sotilgan simkartalar haqida bitta xabar (bir nechta hodisa birlashtiriladi)
+      if (event.isSold && event.oldStatus !== 'sold') {
+        soldCount += 1;
+        if (!soldToastTimer) {
+          soldToastTimer = setTimeout(() => {
+            toast({
+              title: "Yangi sotuvlar!",
+              description: `${soldCount} ta simkarta sotildi`,
+            });
+            soldCount = 0;
+            soldToastTimer = null;
+          }, 1000);
         }
+      }
+    });
 
+    events.addEventListener('auto-check-job', (message: MessageEvent) => {
+      const event: AutoCheckJobEvent = JSON.parse(message.data);
+      if (event.jobId !== autoCheckJobId.current) {
+        const finished = finishedAutoCheckJobs.current;
+        finished.set(event.jobId, event);
+        // Faqat oxirgi bir nechta hodisa saqlanadi
+        if (finished.size > 20) {
+          finished.delete(finished.keys().next().value as string);
+        }
+        return;
+      }
+      applyAutoCheckJobEvent(event);
+    });
+
+    return () => {
+      events.close();
+      if (soldToastTimer) {
+        clearTimeout(soldToastTimer);
+      }
+    };
+  }, []);
+
+  // Avtomatik tekshirish (5 daqiqa): serverda job ishga tushiriladi, natijalar SSE orqali keladi.
+  // Bir nechta ochiq oynalar bir xil jobga qo'shiladi, shuning uchun parallel tekshiruvlar bo'lmaydi.
+  useEffect(() => {
+    const checkSimCards = async () => {
+      setAutoCheckStatus('checking');
+      try {
+        const job = await apiClient.startAutoCheckJob({ scope: 'all' });
+        autoCheckJobId.current = job.jobId;
+        const finished = finishedAutoCheckJobs.current.get(job.jobId);
+        if (finished) {
+          // Tugash hodisasi javobdan oldin kelgan
+          finishedAutoCheckJobs.current.delete(job.jobId);
+          applyAutoCheckJobEvent(finished);
+        } else if (job.status === 'completed') {
+          // Yaqinda tugagan job qaytarildi
+          setAutoCheckStatus('idle');
+        }
       } catch (error) {
         console.error('Avtomatik tekshirishda xatolik:', error);
         setAutoCheckStatus('error');
@@ -216,7 +303,7 @@ export const SimCardProvider: React.FC<{ children: ReactNode }> = ({ children })
         clearInterval(interval);
       }
     };
-  }, [simCards.length, isLoading]); // Faqat simCards.length va isLoading-ga bog'liq
+  }, [simCards.length > 0, isLoading]); // Faqat simkartalar borligi va isLoading-ga bog'liq
 
 
   return (
@@ -226,6 +313,7 @@ export const SimCardProvider: React.FC<{ children: ReactNode }> = ({ children })
       error,
       setSimCards,
       fetchSimCards,
+      syncSimCards,
       createSimCard,
       updateSimCard,
       deleteSimCard,
@@ -1,5 +1,17 @@
 const API_BASE_URL = 'http://localhost:9022';
 
+const SIMCARD_LIST_FIELDS = 'id,code,status,assignedTo,assignedShopName,addedDate,saleDate,lastChecked';
+
+export interface SimCardListParams {
+  limit?: number;
+  cursor?: string;
+  status?: string;
+  shopId?: string;
+  region?: string;
+  dateFrom?: string;
+  dateTo?: string;
+}
+
 // API client class
 class ApiClient {
   private baseURL: string;
@@ -81,8 +93,19 @@ class ApiClient {
   }
 
   // SimCard endpoints
+  // List view does not need checkHistory, so it is left out of the projection
   async getSimCards() {
-    return this.request<any[]>('/simcards');
+    return this.request<any[]>(`/simcards?fields=${SIMCARD_LIST_FIELDS}`);
+  }
+
+  async getSimCardsPage(params: SimCardListParams = {}) {
+    const query = new URLSearchParams({ fields: SIMCARD_LIST_FIELDS, limit: String(params.limit ?? 100) });
+    for (const [key, value] of Object.entries(params)) {
+      if (value !== undefined && value !== null && key !== 'limit') {
+        query.set(key, String(value));
+      }
+    }
+    return this.request<{ items: any[]; nextCursor: string | null }>(`/simcards?${query.toString()}`);
   }
 
   async createSimCard(simCardData: any) {
@@ -116,6 +139,32 @@ class ApiClient {
     return this.request<any>(`/simcards/${simCardId}/check-status`);
   }
 
+  async startAutoCheckJob(params: AutoCheckJobParams = {}) {
+    return this.request<{ jobId: string; status: string; total: number; merged: boolean }>('/simcards/auto-check/jobs', {
+      method: 'POST',
+      body: JSON.stringify({ scope: 'all', ...params }),
+    });
+  }
+
+  async getAutoCheckJob(jobId: string, since = 0) {
+    return this.request<AutoCheckJob>(`/simcards/auto-check/jobs/${jobId}?since=${since}`);
+  }
+
+  // Delta sync: rows changed or deleted after `since` (limit=0 returns only the current version)
+  async syncChanges(since: number, limit?: number) {
+    const query = new URLSearchParams({ since: String(since) });
+    if (limit !== undefined) {
+      query.set('limit', String(limit));
+    }
+    return this.request<SyncResponse>(`/sync?${query.toString()}`);
+  }
+
+  // Server-Sent Events: simcard status changes and auto-check job completions.
+  // EventSource reconnects by itself and resumes with Last-Event-ID.
+  openStatusEvents() {
+    return new EventSource(`${this.baseURL}/events/status-changes`);
+  }
+
   async autoCheckSimCards(simCards: any[]) {
     return this.request<{ results: any[]; timestamp: string }>('/simcards/auto-check', {
       method: 'POST',
@@ -158,6 +207,7 @@ export interface Shop {
   region: string;
   assignedSimCards: string[];
   addedDate: string;
+  changeVersion?: number;
 }
 
 export interface SimCard {
@@ -169,6 +219,57 @@ export interface SimCard {
   addedDate: string;
   saleDate?: string;
   lastChecked?: string;
+  changeVersion?: number;
+}
+
+export interface AutoCheckJobParams {
+  scope?: 'all' | 'shop' | 'region';
+  shopId?: string;
+  region?: string;
+}
+
+export interface AutoCheckJob {
+  jobId: string;
+  status: 'queued' | 'running' | 'completed' | 'failed' | 'cancelled';
+  total: number;
+  checked: number;
+  progress: number;
+  results: any[];
+  nextIndex: number;
+  newlySold: { id: string; code: string; shopName?: string }[];
+  mergedWith: string[];
+  finishedAt: string | null;
+  error: string | null;
+}
+
+export interface StatusChangeEvent {
+  id: string;
+  simCardId: string;
+  code: string;
+  oldStatus: SimCard['status'];
+  newStatus: SimCard['status'];
+  isSold: boolean;
+  timestamp: string;
+  shopId?: string;
+  shopName?: string;
+}
+
+export interface AutoCheckJobEvent {
+  jobId: string;
+  status: AutoCheckJob['status'];
+  total: number;
+  checked: number;
+  newlySold: number;
+  finishedAt: string;
+}
+
+export interface SyncResponse {
+  version: number;
+  reset: boolean;
+  hasMore: boolean;
+  simcards: SimCard[];
+  shops: Shop[];
+  deleted: { simcards: string[]; shops: string[] };
 }
 
 export interface Statistics {